@@ -2,7 +2,11 @@ import json
 from os.path import dirname
 
 from .builder import HiddenMarkovModelBuilder
+from .counts import TrainingCounts
 from .model import HiddenMarkovModel
+from .profiling import Profiler
+from .shared import SharedModel
+from .streaming import ForwardFilter, StreamingDecoder
 
 with open(dirname(__file__) + '/package_info.json') as f:
     _info = json.load(f)
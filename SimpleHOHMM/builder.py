@@ -1,15 +1,29 @@
 from copy import deepcopy
-from itertools import product
+from itertools import islice
+from math import ceil, frexp, ldexp
+from multiprocessing import Pool, cpu_count
 import random as ran
 
+from .counts import TrainingCounts
 from .model import HiddenMarkovModel as HMM
-from .utility import init_matrix, init_matrix_uniform, init_matrix_random
+from .states import CompositeStates
+from .utility import (
+    init_matrix,
+    init_matrix_uniform,
+    init_matrix_random,
+    init_sparse_matrix_uniform,
+    init_sparse_matrix_random
+)
+
+# number of streamed training examples counted at a time
+STREAM_CHUNK_SIZE = 1024
 
 class HiddenMarkovModelBuilder:
 
     def __init__(self):
         self._obs_sequences = list()
         self._state_sequences = list()
+        self._counts = None
         self._single_states = None
         self._all_obs = None
 
@@ -33,6 +47,67 @@ class HiddenMarkovModelBuilder:
         self._obs_sequences += o_lst
         self._state_sequences += s_lst
 
+    def add_training_stream(self, examples, highest_order=1):
+        """
+        Folds training examples straight into running count tables
+        instead of storing them. Only the counts are kept, so the corpus
+        never has to fit in memory.
+        Example:
+            builder.add_training_stream(zip(obs_reader, state_reader))
+        Args:
+            examples (iterable<tuple(list<char>, list<char>)>): pairs of
+                observation and hidden state sequences, such as a
+                generator reading them from a file.
+            highest_order (int): highest order 'build' will be called
+                with. Counts are kept for every order up to it. Must match
+                previous calls.
+        """
+        if(self._counts is None):
+            self._counts = TrainingCounts(highest_order)
+        elif(self._counts.highest_order != highest_order):
+            raise ValueError(
+                "highest order of streamed examples was previously set to "
+                + str(self._counts.highest_order)
+            )
+
+        examples = iter(examples)
+        while(True):
+            chunk = list(islice(examples, STREAM_CHUNK_SIZE))
+            if(len(chunk) == 0):
+                break
+            self._counts.add_batch([o for o, s in chunk], [s for o, s in chunk])
+
+    def get_counts(self, highest_order=1, n_jobs=1):
+        """
+        Counts all training examples previously added to the builder. The
+        counts can be pickled and sent elsewhere, for example to combine
+        the shards of a corpus split across processes or machines.
+        Args:
+            highest_order (int): highest order the counts should support.
+            n_jobs (int): number of worker processes, see 'build'.
+        Returns:
+            TrainingCounts: counts of the stored and streamed examples.
+        """
+        if(highest_order < 1):
+            raise ValueError("highest order must be 1 or greater.")
+        counts = self._get_counts(highest_order, n_jobs)
+        if(counts is self._counts):
+            counts = deepcopy(counts)
+        return counts
+
+    def add_counts(self, counts):
+        """
+        Merges counts taken from another builder, see 'get_counts'. A
+        model built afterwards is the same as one built from all of the
+        training examples in a single builder, up to the order of the
+        state and observation vocabularies.
+        Args:
+            counts (TrainingCounts): counts of some training examples.
+        """
+        if(self._counts is None):
+            self._counts = TrainingCounts(counts.highest_order)
+        self._counts.merge(counts)
+
     def set_single_states(self, single_states):
         """
         Sets the singular hidden states vocabulary for the HMM. If called
@@ -52,7 +127,7 @@ class HiddenMarkovModelBuilder:
         """
         self._all_obs = list(all_obs)
 
-    def build(self, highest_order=1, k_smoothing=0.0, synthesize_states=False, include_pi=True):
+    def build(self, highest_order=1, k_smoothing=0.0, synthesize_states=False, include_pi=True, engine="python", sparse_transitions=False, n_jobs=1):
         """
         Builds a Hidden Markov Model based on the previously added
             training examples.
@@ -66,34 +141,46 @@ class HiddenMarkovModelBuilder:
             include_pi (boolean): True if the starting probabilities should be
                 calculated from explicit training counts. False if the starting
                 probabilities should all be set to 1 and thus ignored.
+            engine (string): compute engine of the resulting model, either
+                'python' or 'numpy'. Defaults to 'python'.
+            sparse_transitions (boolean): store only the valid successors of
+                each state in A. A state 'a-b' can only be followed by states
+                'b-*', so higher order models avoid allocating and iterating
+                over a dense matrix. Smoothing is then applied over valid
+                successors only.
+            n_jobs (int): number of worker processes the training examples
+                are counted over. 1 counts in the current process, -1 uses
+                every CPU.
         Returns:
             HiddenMarkovModel: capable of evaluating, decoding, and learning.
         """
         if(highest_order < 1):
             raise ValueError("highest order must be 1 or greater.")
+        counts = self._get_counts(highest_order, n_jobs)
 
         # build state and observation sets
         if(self._all_obs is None):
-            all_obs = self._get_unique_elements(self._obs_sequences)
+            all_obs = list(counts.all_obs)
         else:
             all_obs = self._all_obs
 
         if(self._single_states is None):
-            single_states = self._get_higher_order_states(self._state_sequences, 1)
-            if(synthesize_states):
-                all_states = self._make_permutations(single_states, highest_order)
-            else:
-                all_states = self._get_higher_order_states(self._state_sequences, highest_order)
+            single_states = list(counts.states[0])
         else:
             synthesize_states = True
             single_states = self._single_states
-            all_states = self._make_permutations(single_states, highest_order)
+        space = CompositeStates(single_states)
+        if(synthesize_states):
+            all_states = space.names(highest_order)
+        else:
+            all_states = list(counts.states[highest_order - 1])
+        state_index = self._index_states(space, all_states, highest_order, synthesize_states)
 
         # build probability distribution parameters
         start_probs = list()
         for i in range(highest_order):
             start_probs.append(self._calculate_start_probs(
-                state_sequences = self._state_sequences,
+                counts = counts,
                 single_states = single_states,
                 order = i+1,
                 k_smoothing = k_smoothing,
@@ -101,8 +188,11 @@ class HiddenMarkovModelBuilder:
                 set_to_1 = not include_pi
             ))
 
-        trans_probs = self._calculate_transition_probs(all_states, highest_order, k_smoothing)
-        emission_probs = self._calculate_emission_probs(single_states, all_obs, k_smoothing)
+        if(sparse_transitions):
+            trans_probs = self._calculate_sparse_transition_probs(counts, space, state_index, highest_order, k_smoothing)
+        else:
+            trans_probs = self._calculate_transition_probs(counts, space, state_index, highest_order, k_smoothing)
+        emission_probs = self._calculate_emission_probs(counts, single_states, all_obs, k_smoothing)
 
         # combine all parameters to build final model
         return HMM(
@@ -112,10 +202,11 @@ class HiddenMarkovModelBuilder:
             all_obs,
             all_states,
             single_states=single_states,
-            order=highest_order
+            order=highest_order,
+            engine=engine
         )
 
-    def build_unsupervised(self, single_states=None, all_obs=None, distribution="random", highest_order=1):
+    def build_unsupervised(self, single_states=None, all_obs=None, distribution="random", highest_order=1, engine="python", sparse_transitions=False):
         """
         Builds a Hidden Markov Model based on a uniform probability
         distribution.
@@ -130,6 +221,10 @@ class HiddenMarkovModelBuilder:
                 distribution, or 'uniform' for a uniform probability
                 distribution. defaults to 'random'.
             highest_order (int): History window of hidden states. Defaults to 1.
+            engine (string): compute engine of the resulting model, either
+                'python' or 'numpy'. Defaults to 'python'.
+            sparse_transitions (boolean): store only the valid successors of
+                each state in A. See 'build'.
         Returns:
             HiddenMarkovModel: capable of evaluating, decoding, and learning.
         """
@@ -142,17 +237,29 @@ class HiddenMarkovModelBuilder:
 
         single_states = list(set(single_states))
         all_obs = list(set(all_obs))
-        all_states = self._make_permutations(single_states, highest_order)
+        space = CompositeStates(single_states)
+        all_states = space.names(highest_order)
         num_states = len(all_states)
+        successors = None
+        if(sparse_transitions):
+            state_index = self._index_states(space, all_states, highest_order, True)
+            successors = self._get_successors(space, state_index, highest_order)
+
         if(distribution == 'uniform'):
-            trans_probs = init_matrix_uniform(num_states, num_states)
+            if(sparse_transitions):
+                trans_probs = init_sparse_matrix_uniform(successors)
+            else:
+                trans_probs = init_matrix_uniform(num_states, num_states)
             emission_probs = init_matrix_uniform(num_states, len(all_obs))
             start_probs = self._init_uniform_start_probs(
                 single_states,
                 highest_order
             )
         else: # 'random'
-            trans_probs = init_matrix_random(num_states, num_states)
+            if(sparse_transitions):
+                trans_probs = init_sparse_matrix_random(successors)
+            else:
+                trans_probs = init_matrix_random(num_states, num_states)
             emission_probs = init_matrix_random(num_states, len(all_obs))
             start_probs = self._init_random_start_probs(
                 single_states,
@@ -167,16 +274,19 @@ class HiddenMarkovModelBuilder:
             all_obs,
             all_states,
             single_states=single_states,
-            order=highest_order
+            order=highest_order,
+            engine=engine
         )
 
     def clear_all_sets(self):
         """
-        Deletes all training examples previously in the builder.
+        Deletes all training examples previously in the builder,
+        including streamed counts.
         Deletes observation and hidden state vocabularies.
         """
         self._obs_sequences = list()
         self._state_sequences = list()
+        self._counts = None
         self._single_states = None
         self._all_obs = None
 
@@ -184,37 +294,84 @@ class HiddenMarkovModelBuilder:
     #      Private      #
     # ----------------- #
 
-    def _get_unique_elements(self, set_of_lists):
-        unique_set = set()
-        for obs_lst in set_of_lists:
-            unique_set.update(set(obs_lst))
-        return list(unique_set)
+    def _get_counts(self, highest_order, n_jobs=1):
+        """
+        Counts of the stored training examples combined with the streamed
+        counts, covering orders up to highest_order. With n_jobs > 1, the
+        stored examples are split into contiguous shards counted by a
+        process pool and merged in order.
+        """
+        if(n_jobs == -1):
+            n_jobs = cpu_count()
+        if(n_jobs < 1):
+            raise ValueError("n_jobs must be -1 or greater than 0.")
+
+        streamed = self._counts
+        if(streamed is not None and streamed.highest_order < highest_order):
+            raise ValueError(
+                "highest order exceeds that of the streamed examples: "
+                + str(streamed.highest_order)
+            )
+        if(streamed is not None and len(self._obs_sequences) == 0):
+            return streamed
+
+        n_jobs = min(n_jobs, max(len(self._obs_sequences), 1))
+
+        if(n_jobs == 1):
+            counts = TrainingCounts(highest_order)
+            counts.add_batch(self._obs_sequences, self._state_sequences)
+        else:
+            shard_size = -(-len(self._obs_sequences) // n_jobs)
+            jobs = [(
+                highest_order,
+                self._obs_sequences[i:i + shard_size],
+                self._state_sequences[i:i + shard_size]
+            ) for i in range(0, len(self._obs_sequences), shard_size)]
+            pool = Pool(n_jobs)
+            try:
+                shards = pool.map(_count_shard, jobs)
+            finally:
+                pool.close()
+                pool.join()
+
+            counts = shards[0]
+            for shard in shards[1:]:
+                counts.merge(shard)
+
+        if(streamed is not None):
+            counts.merge(streamed)
+        return counts
+
+    def _index_states(self, space, all_states, order, synthesized):
+        """
+        Returns:
+            dict<int:int>: code of each state in space => its index in
+                all_states.
+        """
+        if(synthesized):
+            # synthesized states are listed in order of their codes
+            return dict((code, code) for code in range(len(all_states)))
+        return dict(
+            (space.parse(state, order), i) for i, state in enumerate(all_states)
+        )
 
-    def _calculate_transition_probs(self, all_states, order, k_smoothing):
-        matrix_size = len(all_states)
-        state_trans_dict = dict()
+    def _calculate_transition_probs(self, counts, space, state_index, order, k_smoothing):
+        matrix_size = len(state_index)
 
-        # initialize matrix and normalization dict
+        # initialize matrix and normalization list
         trans_probs = init_matrix(matrix_size, matrix_size, "int")
-        for state in all_states:
-            state_trans_dict[state] = 0
+        state_trans = [0] * matrix_size
 
         # insert counts of transitions
-        state_sequences = self._make_higher_order_states(
-            self._state_sequences,
-            order
-        )
-
-        for states in state_sequences:
-            for i in range(1, len(states)):
-                prev_index = all_states.index(states[i - 1])
-                cur_index = all_states.index(states[i])
-                trans_probs[prev_index][cur_index] += 1
-                state_trans_dict[all_states[prev_index]] += 1
+        for (prev_code, cur_code), count in counts.transition_counts(order, space).items():
+            prev_index = state_index[prev_code]
+            cur_index = state_index[cur_code]
+            trans_probs[prev_index][cur_index] += count
+            state_trans[prev_index] += count
 
         # normalize such that for all rows sum(trans_probs[state][s0...sn]) == 1
         for prev_index in range(matrix_size):
-            divisor = state_trans_dict[all_states[prev_index]]
+            divisor = state_trans[prev_index]
             if divisor == 0 and k_smoothing == 0:
                 continue # avoid ZeroDivisionError
 
@@ -226,33 +383,83 @@ class HiddenMarkovModelBuilder:
 
         return trans_probs
 
-    def _calculate_emission_probs(self, all_states, all_obs, k_smoothing):
+    def _calculate_sparse_transition_probs(self, counts, space, state_index, order, k_smoothing):
+        """
+        Same estimate as _calculate_transition_probs, but only the valid
+            successors of each state are stored and smoothed.
+        Returns:
+            list<dict<int:float>>: row i maps the index of each valid
+                successor of state i to its transition probability.
+        """
+        trans_probs = [
+            dict.fromkeys(successors, 0)
+            for successors in self._get_successors(space, state_index, order)
+        ]
+
+        # insert counts of transitions
+        for (prev_code, cur_code), count in counts.transition_counts(order, space).items():
+            prev_index = state_index[prev_code]
+            cur_index = state_index[cur_code]
+            trans_probs[prev_index][cur_index] += count
+
+        # normalize such that for all rows sum(trans_probs[state].values()) == 1
+        for row in trans_probs:
+            divisor = sum(row.values())
+            if divisor == 0 and k_smoothing == 0:
+                continue # avoid ZeroDivisionError
+
+            for cur_index in row:
+                row[cur_index] += k_smoothing
+                row[cur_index] /= float(divisor + (len(row) * k_smoothing))
+
+        return trans_probs
+
+    def _get_successors(self, space, state_index, order):
+        """
+        Lists the valid successors of each state: for order > 1, those
+            states whose history begins where the state's history ends.
+        Example (order = 2):
+            'a-b' => ['b-a', 'b-b']
+        Args:
+            space (CompositeStates): encoding of the states.
+            state_index (dict<int:int>): code of each state => its index.
+        Returns:
+            list<list<int>>: indices of the successors of each state, in
+                ascending order.
+        """
+        if(order == 1):
+            return [list(range(len(state_index))) for i in range(len(state_index))]
+
+        # dicts are unordered before Python 3.7
+        codes = sorted(state_index, key=state_index.get)
+        return [
+            sorted(
+                state_index[successor]
+                for successor in space.successors(code, order)
+                if successor in state_index
+            )
+            for code in codes
+        ]
+
+    def _calculate_emission_probs(self, counts, all_states, all_obs, k_smoothing):
         rows = len(all_states)
         columns = len(all_obs)
-        state_emission_dict = dict()
+        state_index = dict((state, i) for i, state in enumerate(all_states))
+        obs_index = dict((obs, i) for i, obs in enumerate(all_obs))
+        state_emissions = [0] * rows
 
-        # initializate matrix and normalization dict
+        # initializate matrix
         emission_probs = init_matrix(rows, columns, "int")
-        for state in all_states:
-            state_emission_dict[state] = 0 + k_smoothing
 
         # insert counts of emissions
-        for i in range(len(self._obs_sequences)):
-            obs_lst = self._obs_sequences[i]
-            states_lst = self._state_sequences[i]
-            for j in range(len(obs_lst)):
-                obs = obs_lst[j]
-                obs_index = all_obs.index(obs)
-
-                state = states_lst[j]
-                state_index = all_states.index(state)
-
-                emission_probs[state_index][obs_index] += 1
-                state_emission_dict[state] += 1
+        for (state, obs), count in counts.emission_counts().items():
+            row = _index_of(state_index, state)
+            emission_probs[row][_index_of(obs_index, obs)] += count
+            state_emissions[row] += count
 
         # normalize such that for all rows sum(emission_probs[state][o0...on]) == 1
         for row in range(rows):
-            divisor = float(state_emission_dict[all_states[row]])
+            divisor = float(_add_one_at_a_time(k_smoothing, state_emissions[row]))
             for column in range(columns):
                 emission_probs[row][column] += k_smoothing
                 emission_probs[row][column] /= float(
@@ -261,30 +468,11 @@ class HiddenMarkovModelBuilder:
 
         return emission_probs
 
-    def _get_higher_order_states(self, state_sequences, order):
-        if(order == 1):
-            return self._get_unique_elements(state_sequences)
-
-        all_states_set = set()
-
-        for sequence in state_sequences:
-            if(len(sequence) <= order):
-                continue
-
-            for i in range(order - 1, len(sequence)):
-                state = ""
-                for j in range(i-order+1, i+1):
-                    state += (sequence[j] + '-')
-
-                all_states_set.add(state[:len(state)-1])
-
-        return list(all_states_set)
-
-    def _calculate_start_probs(self, state_sequences, single_states, order, k_smoothing, synthesize_states, set_to_1):
+    def _calculate_start_probs(self, counts, single_states, order, k_smoothing, synthesize_states, set_to_1):
         """
         Calculates the starting probability distribution for a given order.
         Args:
-            state_sequences (list<list<char>>): Hidden state sequences
+            counts (TrainingCounts): counts of the training examples
             single_states (list<string>): list of possible singular hidden
                 states. These states should disregard HMM order.
             order (int): History window of hidden states.
@@ -302,7 +490,7 @@ class HiddenMarkovModelBuilder:
         if synthesize_states:
             states = self._make_permutations(single_states, order)
         else:
-            states = self._get_higher_order_states(state_sequences, order)
+            states = list(counts.states[order - 1])
 
         for state in states:
             start_probs_dict[state] = 1 if set_to_1 else k_smoothing
@@ -311,16 +499,12 @@ class HiddenMarkovModelBuilder:
             return start_probs_dict
 
         # insert counts
-        start_state_emissions = 0
-        for state_seq in state_sequences:
-            if(len(state_seq) < order):
-                continue
-
-            state = ""
-            for i in range(order):
-                state += (state_seq[i] + '-')
-            start_probs_dict[state[:len(state)-1]] += 1
-            start_state_emissions += 1
+        start_state_emissions = counts.num_starts[order - 1]
+        for state, count in counts.start_counts(order).items():
+            start_probs_dict[state] = _add_one_at_a_time(
+                start_probs_dict[state],
+                count
+            )
 
         # normalize dictionary such that sum(start_probs_dict[s0...sn]) = 1
         for state in start_probs_dict.keys():
@@ -357,49 +541,45 @@ class HiddenMarkovModelBuilder:
 
         return start_probs
 
-    def _make_higher_order_states(self, state_sequences, order):
-        """
-        Args:
-            state_sequences (list<list<string>>): states to convert to a
-                given order.
-            order (int): n-gram value of history.
-        Returns:
-            list<list<string>> state_sequences mapped to n-grams.
-        Example:
-            state_sequences = [['a', 'b', 'c', 'd', 'e', 'f']]
-            order = 1: [['a', 'b', 'c', 'd', 'e', 'f']]
-            order = 2: [['a-b', 'b-c', 'c-d', 'd-e', 'e-f']]
-            order = 3: [['a-b-c', 'b-c-d', 'c-d-e', 'd-e-f']]
-        """
-        if(order == 1):
-            return state_sequences
-
-        new_sequences = []
-        for sequence in state_sequences:
-            new_sequence = []
-            for i in range(order-1, len(sequence)):
-                state = ""
-                for j in range(i-order+1, i+1):
-                    state += (sequence[j] + '-')
-
-                new_sequence.append(state[:len(state)-1])
-
-            new_sequences.append(new_sequence)
-
-        return new_sequences
-
     def _make_permutations(self, states, highest_order):
         """ makes a list of all permutation states from a single state. """
-        if(highest_order == 1):
-            return states
-
-        states_lists = product(states, repeat = highest_order)
-        new_states = []
-        for states_lst in states_lists:
-            state = ""
-            for i in range(len(states_lst)):
-                state += (states_lst[i] + '-')
-
-            new_states.append(state[:len(state)-1])
-
-        return new_states
+        return CompositeStates(states).names(highest_order)
+
+def _count_shard(job):
+    """ Counts a shard of training examples, run by a worker process """
+    highest_order, o_lst, s_lst = job
+    counts = TrainingCounts(highest_order)
+    counts.add_batch(o_lst, s_lst)
+    return counts
+
+def _index_of(index, item):
+    """ index[item], raising ValueError like list.index """
+    if item not in index:
+        raise ValueError(repr(item) + " is not in list")
+    return index[item]
+
+def _add_one_at_a_time(value, count):
+    """
+    value + count, rounded as if count ones were added to value one at a
+    time. Probabilities were originally estimated that way, and summing
+    them identically keeps built models unchanged. Adding 1 is exact
+    until the sum crosses a power of two, so the ones are added in one
+    step per power of two and the rounding of each crossing is replayed.
+    """
+    if(value == 0):
+        return value + count
+
+    while(count > 0):
+        if(1 <= value < 2 ** 53):
+            # additions that stay below the next power of two are exact
+            mantissa, exponent = frexp(value)
+            exact = min(count, int(ceil(ldexp(1.0, exponent) - value)) - 1)
+            if(exact > 0):
+                value += exact
+                count -= exact
+                continue
+        elif(value + 1 == value):
+            break
+        value += 1
+        count -= 1
+    return value
@@ -0,0 +1,210 @@
+from collections import Counter
+from itertools import chain
+
+from .states import SEPARATOR
+
+class TrainingCounts:
+    """
+    Running count tables of labeled training examples from which
+    HiddenMarkovModelBuilder estimates (A,B,pi). Each example is folded
+    into the tables as it is added and can then be discarded, so memory
+    depends on the number of distinct states and observations rather than
+    on the size of the corpus.
+    Hidden state sequences are encoded once to integer codes. Higher order
+    states are then tuples of codes, and each table is accumulated in bulk
+    by a Counter rather than state by state.
+    Notation used:
+        highest_order: highest order of hidden states counted. Models of
+            any order up to highest_order can be built from the counts.
+        all_obs: set of observations seen.
+        states[i]: set of order (i + 1) states seen. For i > 0, only
+            sequences longer than (i + 1) states are included.
+        num_starts[i]: number of sequences of at least (i + 1) states.
+    """
+    def __init__(self, highest_order=1):
+        if(highest_order < 1):
+            raise ValueError("highest order must be 1 or greater.")
+        self.highest_order = highest_order
+        self.all_obs = set()
+        self.states = [set() for i in range(highest_order)]
+        self.num_starts = [0] * highest_order
+
+        # tables keyed by tuples of state codes
+        self._codes = dict()
+        self._state_names = list()
+        self._seen = [set() for i in range(highest_order)]
+        self._start = [Counter() for i in range(highest_order)]
+        self._trans = [Counter() for i in range(highest_order)]
+        self._emit = Counter()
+
+    def add(self, o, s):
+        """
+        Folds a single training example into the counts.
+        Args:
+            o (list<char>): Observation sequence
+            s (list<char>): Hidden state sequence
+        """
+        self.add_batch([o], [s])
+
+    def add_batch(self, o_lst, s_lst):
+        """
+        Folds a batch of training examples into the counts. Each table is
+        updated once for the whole batch.
+        Args:
+            o_lst (list<list<char>>): Observation sequences
+            s_lst (list<list<char>>): Hidden state sequences
+        """
+        o_lst = o_lst[:len(s_lst)]
+        s_lst = s_lst[:len(o_lst)]
+        for o in o_lst:
+            self.all_obs.update(set(o))
+        codes_lst = []
+        for s in s_lst:
+            self.states[0].update(set(s))
+            codes_lst.append(self._encode(s))
+
+        for i in range(self.highest_order):
+            order = i + 1
+            codes_lst = [codes for codes in codes_lst if len(codes) >= order]
+            self.num_starts[i] += len(codes_lst)
+            self._start[i].update(tuple(codes[:order]) for codes in codes_lst)
+            if(order > 1):
+                for codes in codes_lst:
+                    if(len(codes) > order):
+                        self._add_states(i, codes)
+
+            # a transition between states of order k is a (k + 1)-gram
+            self._trans[i].update(chain.from_iterable(
+                _ngrams(codes, order + 1) for codes in codes_lst
+            ))
+
+        self._emit.update(chain.from_iterable(map(zip, s_lst, o_lst)))
+
+    def merge(self, other):
+        """
+        Adds the counts of other into these counts. Orders of other above
+        highest_order are ignored.
+        Args:
+            other (TrainingCounts): counts of at least the same order.
+        Returns:
+            TrainingCounts: self
+        """
+        if(other.highest_order < self.highest_order):
+            raise ValueError(
+                "cannot merge counts of order "
+                + str(other.highest_order)
+                + " into counts of order "
+                + str(self.highest_order)
+            )
+
+        recode = self._encode(other._state_names)
+        def translate(table):
+            return dict(
+                (tuple(recode[code] for code in key), count)
+                for key, count in table.items()
+            )
+
+        self.all_obs.update(other.all_obs)
+        for i in range(self.highest_order):
+            self.states[i].update(other.states[i])
+            self.num_starts[i] += other.num_starts[i]
+            self._seen[i].update(translate(dict.fromkeys(other._seen[i])))
+            self._start[i].update(translate(other._start[i]))
+            self._trans[i].update(translate(other._trans[i]))
+        self._emit.update(other._emit)
+        return self
+
+    def start_counts(self, order):
+        """
+        Returns:
+            dict<string:int>: count of each state of the given order
+                starting a sequence.
+        """
+        return dict(
+            (self._state_name(key), count)
+            for key, count in self._start[order - 1].items()
+        )
+
+    def transition_counts(self, order, states=None):
+        """
+        Args:
+            order (int): order of the states.
+            states (CompositeStates): if given, states are keyed by their
+                code in states rather than by name.
+        Returns:
+            dict<tuple(string, string):int>: count of each transition
+                between states of the given order. Keys are tuple(int, int)
+                if states is given.
+        """
+        if(states is not None):
+            return self._encoded_transition_counts(order, states)
+
+        names = dict()
+        def name(key):
+            if key not in names:
+                names[key] = self._state_name(key)
+            return names[key]
+
+        return dict(
+            ((name(key[:-1]), name(key[1:])), count)
+            for key, count in self._trans[order - 1].items()
+        )
+
+    def emission_counts(self):
+        """
+        Returns:
+            dict<tuple(string, string):int>: count of each single state
+                emitting each observation.
+        """
+        return dict(self._emit)
+
+    def _encoded_transition_counts(self, order, states):
+        """
+        transition_counts keyed by codes of states. A transition is an
+        (order + 1)-gram, so with radix S the code of the (order + 1)-gram
+        gives the code of the state left, code // S, and of the state
+        entered, code % S^order.
+        """
+        digits = [states.index(name) for name in self._state_names]
+        radix = states.radix
+        modulus = radix ** order
+
+        encoded = dict()
+        for key, count in self._trans[order - 1].items():
+            code = 0
+            for c in key:
+                code = code * radix + digits[c]
+            encoded[(code // radix, code % modulus)] = count
+        return encoded
+
+    def _encode(self, sequence):
+        """ Maps states to integer codes, assigning codes to new states """
+        for state in set(sequence).difference(self._codes):
+            self._codes[state] = len(self._state_names)
+            self._state_names.append(state)
+        return list(map(self._codes.__getitem__, sequence))
+
+    def _add_states(self, i, codes):
+        """
+        Adds the order (i + 1) states of codes to states[i] in order of
+        appearance. Only states not seen before are named.
+        """
+        new_states = set(_ngrams(codes, i + 1)).difference(self._seen[i])
+        if(len(new_states) == 0):
+            return
+
+        for key in _ngrams(codes, i + 1):
+            if key in new_states:
+                self.states[i].add(self._state_name(key))
+                new_states.discard(key)
+        self._seen[i].update(_ngrams(codes, i + 1))
+
+    def _state_name(self, key):
+        """ Name of the state encoded by a tuple of codes, e.g. 'a-b' """
+        if(len(key) == 1):
+            return self._state_names[key[0]]
+        return SEPARATOR.join(self._state_names[code] for code in key)
+
+def _ngrams(codes, n):
+    """ tuples of n consecutive elements of codes """
+    return zip(*[codes[i:] for i in range(n)])
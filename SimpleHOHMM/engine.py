@@ -0,0 +1,792 @@
+from timeit import default_timer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .statistics import SufficientStatistics
+
+ENGINES = ("python", "numpy")
+
+class NumpyEngine:
+    """
+    Vectorized compute engine for HiddenMarkovModel. Parameters (A,B,pi)
+    are held as contiguous ndarrays so that every time step of the
+    forward, backward, and Viterbi recursions is a single matrix-vector
+    product or max-reduction instead of a nested loop over states.
+    Results match the list implementation of HiddenMarkovModel.
+    Dense A, B and their stored logarithms are viewed rather than copied
+    when they support the array interface, such as the parameters of a
+    loaded model, and emissions of the states are gathered from B per
+    observation. A loaded or shared model thus costs each process O(N+S)
+    private memory on top of the shared parameters.
+    A sparse A is stored as padded predecessor and successor tables so that
+    a time step costs O(N*W) instead of O(N^2). These tables are built
+    when the engine is created, also for a loaded model.
+    Notation used:
+        N: number of (possibly composite) states in the model
+        S: number of single states in the model
+        V: size of the observation vocabulary
+        T: length of an observation sequence
+        W: largest number of predecessors or successors of a state
+    """
+    def __init__(self, hmm, log_A=None, log_B=None):
+        """
+        Args:
+            hmm (HiddenMarkovModel): compiled model to compute for.
+            log_A, log_B: stored log parameters to view instead of
+                computing them. log_A is ignored for a sparse A.
+        """
+        if(np is None):
+            raise ImportError("The 'numpy' engine requires NumPy to be installed.")
+
+        single_states = hmm._single_states
+        num_states = len(hmm._all_states)
+
+        self._order = hmm._highest_order
+        self._obs_index = hmm._obs_index
+        self._num_states = num_states
+        self._sparse = hmm._sparse
+        if(self._sparse):
+            self._load_sparse_A(hmm._A)
+        else:
+            self._A = np.ascontiguousarray(hmm._A, dtype=np.float64)
+
+        # state names of order 1 returned when decoding
+        self._state_names = [
+            single_states[s_single] for s_single in hmm._state_to_single
+        ]
+
+        # emission probabilities indexed [observation][state]
+        B = np.asarray(hmm._B, dtype=np.float64)
+        self._state_to_single = np.array(hmm._state_to_single, dtype=np.intp)
+        self._num_single_states = len(single_states)
+        self._emissions = _StateColumns(B, self._state_to_single)
+
+        # forward initialization weights only the first S rows of alpha by
+        # B of the same row; the remaining states have pi 0
+        num_init = min(len(single_states), num_states)
+        self._forward_pi = np.zeros(num_states)
+        self._forward_pi[:num_init] = [
+            hmm._pi[0][state] for state in single_states[:num_init]
+        ]
+        self._forward_B = _StateColumns(
+            B, np.minimum(np.arange(num_states), num_init - 1)
+        )
+
+        # self._pi[t][s] is pi of the order (t+1) history of state s
+        self._pi = [np.array(pi_row, dtype=np.float64) for pi_row in hmm._pi_lookup]
+
+        # log parameters for the Viterbi algorithm
+        with np.errstate(divide='ignore'):
+            if(self._sparse):
+                self._log_pred_A = np.log(self._pred_A)
+            elif(log_A is not None):
+                self._log_A = np.asarray(log_A, dtype=np.float64)
+            else:
+                self._log_A = np.log(self._A)
+            if(log_B is not None):
+                log_B = np.asarray(log_B, dtype=np.float64)
+            else:
+                log_B = np.log(B)
+            self._log_emissions = _StateColumns(log_B, self._state_to_single)
+            self._log_pi = [np.log(pi) for pi in self._pi]
+
+    def _load_sparse_A(self, A):
+        """
+        Builds the tables of a sparse A, padded with probability 0:
+            _succ_index[s][j], _succ_A[s][j]: j-th successor of state s
+            _pred_index[s][j], _pred_A[s][j]: j-th predecessor of state s,
+                in ascending order of state index.
+        """
+        predecessors = [[] for row in A]
+        for s_prime, row in enumerate(A):
+            for s_index, prob in row.items():
+                predecessors[s_index].append((s_prime, prob))
+
+        self._num_succ = np.array([len(row) for row in A], dtype=np.intp)
+        self._succ_index, self._succ_A = self._pad_table(
+            [list(row.items()) for row in A]
+        )
+        self._pred_index, self._pred_A = self._pad_table(predecessors)
+
+    def _pad_table(self, rows):
+        width = max([1] + [len(row) for row in rows])
+        index = np.zeros((len(rows), width), dtype=np.intp)
+        values = np.zeros((len(rows), width))
+        for i, row in enumerate(rows):
+            if(len(row) > 0):
+                index[i, :len(row)], values[i, :len(row)] = zip(*row)
+        return index, values
+
+    def _propagate(self, alpha):
+        """
+        One transition step of the forward algorithm: alpha A.
+        alpha has shape (N,) or (B,N).
+        """
+        if(self._sparse):
+            return (alpha[..., self._pred_index] * self._pred_A).sum(axis=-1)
+        return alpha.dot(self._A)
+
+    def _pull(self, weighted_beta):
+        """
+        One transition step of the backward algorithm: A weighted_beta.
+        weighted_beta has shape (N,).
+        """
+        if(self._sparse):
+            return (self._succ_A * weighted_beta[self._succ_index]).sum(axis=1)
+        return self._A.dot(weighted_beta)
+
+    def _max_step(self, delta):
+        """
+        One transition step of the Viterbi algorithm. delta has shape (N,)
+        or (B,N).
+        Returns:
+            best log probability of reaching each state, shape of delta.
+            backpointers psi to the maximizing previous state, shape of delta.
+        """
+        if(self._sparse):
+            scores = delta[..., self._pred_index] + self._log_pred_A
+            best_j = np.argmax(scores, axis=-1)
+            best = np.take_along_axis(scores, best_j[..., np.newaxis], axis=-1)[..., 0]
+            psi = np.take_along_axis(
+                np.broadcast_to(self._pred_index, scores.shape),
+                best_j[..., np.newaxis],
+                axis=-1
+            )[..., 0]
+            psi[best == -np.inf] = 0
+            return best, psi
+
+        scores = delta[..., np.newaxis] + self._log_A
+        psi = np.argmax(scores, axis=-2)
+        best = np.take_along_axis(scores, psi[..., np.newaxis, :], axis=-2)[..., 0, :]
+        return best, psi
+
+    def encode(self, sequence):
+        """ Maps an observation sequence to an array of vocabulary indices """
+        return np.fromiter(
+            (self._obs_index[obs] for obs in sequence),
+            dtype=np.intp,
+            count=len(sequence)
+        )
+
+    def forward(self, sequence):
+        """ scaled alpha matrix of shape (N,T) and normalizers of shape (T,) """
+        obs = self.encode(sequence)
+        alpha = np.zeros((self._num_states, len(obs)))
+        scales = np.zeros(len(obs))
+
+        # initialization step
+        alpha[:, 0] = self.forward_start(obs[0])
+        self._scale_column(alpha, 0, scales)
+
+        # iterative step
+        for t in range(1, len(obs)):
+            alpha[:, t] = self.forward_step(alpha[:, t - 1], t, obs[t])
+            self._scale_column(alpha, t, scales)
+
+        return alpha, scales
+
+    def forward_start(self, obs_index):
+        """ unscaled alpha of each state for the first observation """
+        return self._forward_pi * self._forward_B[obs_index]
+
+    def forward_step(self, prev_alpha, t, obs_index):
+        """ unscaled alpha of each state at observation t, shape (N,) """
+        prev_alpha = np.asarray(prev_alpha)
+        if(t < self._order):
+            alpha = prev_alpha.sum() * self._pi[t]
+        else:
+            alpha = self._propagate(prev_alpha)
+        return alpha * self._emissions[obs_index]
+
+    def backward(self, sequence, scales):
+        """ scaled beta matrix of shape (N,T) """
+        obs = self.encode(sequence)
+        beta = np.zeros((self._num_states, len(obs)))
+
+        # initialization step
+        beta[:, -1] = 1
+
+        # iterative step
+        for t in reversed(range(len(obs) - 1)):
+            beta[:, t] = self._pull(beta[:, t + 1] * self._emissions[obs[t + 1]])
+            if(scales[t + 1] != 0):
+                beta[:, t] /= scales[t + 1]
+
+        return beta
+
+    def _scale_column(self, alpha, t, scales):
+        scales[t] = alpha[:, t].sum()
+        if(scales[t] != 0):
+            alpha[:, t] /= scales[t]
+
+    def _gamma(self, alpha, beta):
+        """ state posteriors of shape (N,T) from scaled alpha and beta """
+        gamma = alpha * beta
+        totals = gamma.sum(axis=0)
+        gamma[:, totals > 0] /= totals[totals > 0]
+        return gamma
+
+    def posteriors(self, sequence):
+        """ single state posteriors, shape (T,S) """
+        if(len(sequence) == 0):
+            return np.zeros((0, self._num_single_states))
+        alpha, scales = self.forward(sequence)
+        beta = self.backward(sequence, scales)
+        return self._sum_single(self._gamma(alpha, beta).T)
+
+    def posteriors_many(self, sequences, batch_size):
+        """ single state posteriors of each sequence, shapes (T,S) """
+        posteriors = [
+            np.zeros((0, self._num_single_states)) for seq in sequences
+        ]
+        for indices, obs, lengths in self._buckets(sequences, batch_size):
+            single_gamma = self._sum_single(self._gamma_batch(obs, lengths))
+            for i, rows, length in zip(indices, single_gamma, lengths):
+                posteriors[i] = rows[:length]
+        return posteriors
+
+    def _sum_single(self, values):
+        """ sums values of states, on the last axis, into their single states """
+        single = np.zeros(values.shape[:-1] + (self._num_single_states,))
+        np.add.at(single.T, self._state_to_single, values.T)
+        return single
+
+    def _gamma_batch(self, obs, lengths):
+        """
+        Scaled forward-backward algorithm across a padded bucket. Beta of
+        each row starts at the final observation of its sequence.
+        Returns:
+            state posteriors, shape (B,T,N). Padding is left unspecified.
+        """
+        rows, columns = obs.shape
+        alpha = np.zeros((rows, columns, self._num_states))
+        scales = np.zeros((rows, columns))
+
+        # forward pass
+        alpha_t = self._forward_pi * self._forward_B[obs[:, 0]]
+        for t in range(columns):
+            if(t > 0):
+                if(t < self._order):
+                    alpha_t = alpha[:, t - 1].sum(axis=1)[:, np.newaxis] * self._pi[t]
+                else:
+                    alpha_t = self._propagate(alpha[:, t - 1])
+                alpha_t *= self._emissions[obs[:, t]]
+            scales[:, t] = alpha_t.sum(axis=1)
+            nonzero = scales[:, t] != 0
+            alpha_t[nonzero] /= scales[nonzero, t][:, np.newaxis]
+            alpha[:, t] = alpha_t
+
+        # backward pass
+        beta = np.zeros(alpha.shape)
+        beta[np.arange(rows), lengths - 1] = 1
+        scales[scales == 0] = 1
+        for t in reversed(range(columns - 1)):
+            weighted_beta = beta[:, t + 1] * self._emissions[obs[:, t + 1]]
+            if(self._sparse):
+                beta_t = (self._succ_A * weighted_beta[:, self._succ_index]).sum(axis=2)
+            else:
+                beta_t = weighted_beta.dot(self._A.T)
+            live = t + 1 < lengths
+            beta[live, t] = beta_t[live] / scales[live, t + 1][:, np.newaxis]
+
+        gamma = alpha * beta
+        totals = gamma.sum(axis=2)
+        nonzero = totals > 0
+        gamma[nonzero] /= totals[nonzero][:, np.newaxis]
+        return gamma
+
+    def expected_counts(self, sequences, profiler=None, low_memory=False):
+        """
+        E-step of the Baum-Welch Algorithm over sequences. Sums of gamma and
+        xi are accumulated as matrix products without materializing xi.
+        Args:
+            sequences (list<O>): Observation sequences
+            profiler (Profiler): records the time of each phase if given.
+            low_memory (boolean): use the checkpointed forward-backward
+                algorithm, see _add_checkpointed_counts.
+        Returns:
+            SufficientStatistics
+        """
+        num_states = self._num_states
+        num_obs = len(self._obs_index)
+        if(self._sparse):
+            trans = np.zeros(self._succ_A.shape)
+        else:
+            trans = np.zeros((num_states, num_states))
+        counts = {
+            "start": np.zeros(num_states),
+            "trans": trans,
+            "trans_total": np.zeros(num_states),
+            "emit": np.zeros((self._num_single_states, num_obs))
+        }
+        num_sequences = 0
+        log_likelihood = 0.0
+
+        for sequence in sequences:
+            if(len(sequence) == 0):
+                log_likelihood = -np.inf
+                continue
+            obs = self.encode(sequence)
+            num_sequences += 1
+            if(low_memory):
+                log_likelihood += self._add_checkpointed_counts(obs, counts, profiler)
+                continue
+
+            if(profiler is not None):
+                start = default_timer()
+            alpha, scales = self.forward(sequence)
+            if(profiler is not None):
+                start = profiler.lap("forward", start)
+            beta = self.backward(sequence, scales)
+            if(profiler is not None):
+                start = profiler.lap("backward", start)
+            with np.errstate(divide='ignore'):
+                log_likelihood += np.log(scales).sum()
+            self._add_counts(obs, alpha, beta, True, counts, profiler)
+
+        stats = SufficientStatistics(0, 0, 0)
+        stats.num_sequences = num_sequences
+        stats.log_likelihood = float(log_likelihood)
+        stats.start = counts["start"].tolist()
+        if(self._sparse):
+            stats.trans = [
+                dict(zip(index[:n].tolist(), values[:n].tolist()))
+                for index, values, n
+                in zip(self._succ_index, counts["trans"], self._num_succ)
+            ]
+        else:
+            stats.trans = counts["trans"].tolist()
+        stats.trans_total = counts["trans_total"].tolist()
+        stats.emit = counts["emit"].tolist()
+        stats.emit_total = counts["emit"].sum(axis=1).tolist()
+        return stats
+
+    def _add_counts(self, obs, alpha, beta, first, counts, profiler=None):
+        """
+        Adds the expected counts of consecutive observations into counts.
+        Args:
+            obs: observation indices of the columns of beta, shape (L',)
+            alpha: scaled alpha of the observations, shape (N,L). The last
+                observation of the sequence has no xi, otherwise beta
+                holds one more column.
+            beta: scaled beta of the observations, shape (N,L'), L' = L or
+                L + 1
+            first (boolean): whether the first column is the start of the
+                sequence.
+            counts (dict): start, trans, trans_total and emit arrays.
+            profiler (Profiler): records the time of each phase if given.
+        """
+        if(profiler is not None):
+            start = default_timer()
+        columns = alpha.shape[1]
+
+        # gamma: state posteriors, shape (N,L)
+        gamma = self._gamma(alpha, beta[:, :columns])
+        if(profiler is not None):
+            start = profiler.lap("gamma", start)
+
+        # xi summed over time: xi_t = alpha_t A (b_t+1 beta_t+1) / norm_t
+        transitions = beta.shape[1] - 1
+        weighted_beta = beta[:, 1:] * self._emissions[obs[1:]].T
+        trans = counts["trans"]
+        if(self._sparse):
+            for t in range(transitions):
+                next_beta = weighted_beta[:, t][self._succ_index]
+                xi_t = alpha[:, t][:, np.newaxis] * self._succ_A * next_beta
+                norm = xi_t.sum()
+                if(norm != 0):
+                    trans += xi_t / norm
+        else:
+            norms = (alpha[:, :transitions] * self._A.dot(weighted_beta)).sum(axis=0)
+            norms[norms == 0] = np.inf
+            trans += self._A * alpha[:, :transitions].dot((weighted_beta / norms).T)
+        if(profiler is not None):
+            start = profiler.lap("xi", start)
+
+        if(first):
+            counts["start"] += gamma[:, 0]
+        counts["trans_total"] += gamma[:, :transitions].sum(axis=1)
+        single_gamma = np.zeros((self._num_single_states, columns))
+        np.add.at(single_gamma, self._state_to_single, gamma)
+        np.add.at(counts["emit"], (slice(None), obs[:columns]), single_gamma)
+        if(profiler is not None):
+            profiler.lap("accumulate", start)
+
+    def _add_checkpointed_counts(self, obs, counts, profiler=None):
+        """
+        Checkpointed forward-backward algorithm, see
+        HiddenMarkovModel._add_checkpointed_counts. Counts of each segment
+        are added with _add_counts.
+        Returns:
+            float: log P(O|lambda)
+        """
+        if(profiler is not None):
+            start = default_timer()
+        columns = len(obs)
+        interval = int(np.ceil(np.sqrt(columns)))
+
+        scales = np.zeros(columns)
+        checkpoints = []
+        alpha_t = None
+        for t in range(columns):
+            alpha_t = self._scaled_alpha(alpha_t, t, obs[t], scales)
+            if(t % interval == 0):
+                checkpoints.append(alpha_t)
+        with np.errstate(divide='ignore'):
+            log_likelihood = np.log(scales).sum()
+        if(profiler is not None):
+            start = profiler.lap("forward", start)
+
+        next_beta = None
+        for first in reversed(range(0, columns, interval)):
+            last = min(first + interval, columns)
+            alpha = np.zeros((self._num_states, last - first))
+            alpha[:, 0] = checkpoints[first // interval]
+            for t in range(first + 1, last):
+                alpha[:, t - first] = self._scaled_alpha(alpha[:, t - first - 1], t, obs[t], scales)
+
+            # beta of the segment and of the first observation after it
+            beta = np.zeros((self._num_states, last - first + (next_beta is not None)))
+            if(next_beta is None):
+                beta[:, -1] = 1
+            else:
+                beta[:, -1] = next_beta
+            for t in reversed(range(beta.shape[1] - 1)):
+                beta[:, t] = self._pull(beta[:, t + 1] * self._emissions[obs[first + t + 1]])
+                if(scales[first + t + 1] != 0):
+                    beta[:, t] /= scales[first + t + 1]
+            if(profiler is not None):
+                start = profiler.lap("backward", start)
+
+            self._add_counts(
+                obs[first:first + beta.shape[1]],
+                alpha,
+                beta,
+                first == 0,
+                counts,
+                profiler
+            )
+            if(profiler is not None):
+                start = default_timer()
+            next_beta = beta[:, 0]
+
+        return log_likelihood
+
+    def _scaled_alpha(self, prev_alpha, t, obs_index, scales):
+        """ scaled alpha at observation t, recording its normalizer """
+        if(t == 0):
+            alpha_t = self.forward_start(obs_index)
+        else:
+            alpha_t = self.forward_step(prev_alpha, t, obs_index)
+        scales[t] = alpha_t.sum()
+        if(scales[t] != 0):
+            alpha_t = alpha_t / scales[t]
+        return alpha_t
+
+    def viterbi(self, sequence):
+        """
+        Args:
+            sequence (list<char>): observation sequence O
+        Returns:
+            list<string>: hidden state sequence S
+        """
+        delta, psi = self.viterbi_forward(sequence)
+        return self.viterbi_backward(delta, psi)
+
+    def viterbi_forward(self, sequence):
+        """
+        log probability delta at the last observation, shape (N,), and
+        backpointers psi of shape (T,N). Row t of psi holds the previous
+        state of the best path reaching each state at observation t.
+        """
+        obs = self.encode(sequence)
+        psi = np.zeros((len(obs), self._num_states), dtype=np.int32)
+
+        # initialization step
+        delta = self.viterbi_start(obs[0])
+
+        # iterative step
+        for t in range(1, len(obs)):
+            delta, psi[t] = self.viterbi_step(delta, t, obs[t])
+
+        return delta, psi
+
+    def viterbi_start(self, obs_index):
+        """ log probability delta of each state for the first observation """
+        return self._log_pi[0] + self._log_emissions[obs_index]
+
+    def viterbi_step(self, prev_delta, t, obs_index):
+        """
+        One step of the Viterbi algorithm at observation t.
+        Returns:
+            log probability delta of shape (N,)
+            backpointers psi of shape (N,)
+        """
+        if(t < self._order):
+            # transition does not depend on the previous state
+            best = np.argmax(prev_delta)
+            psi = np.full(self._num_states, best, dtype=np.intp)
+            delta = prev_delta[best] + self._log_pi[t]
+        else:
+            delta, psi = self._max_step(prev_delta)
+
+        return delta + self._log_emissions[obs_index], psi
+
+    def viterbi_nbest_forward(self, sequence, k):
+        """
+        List Viterbi Algorithm keeping the k best paths reaching each
+        state, see HiddenMarkovModel._viterbi_nbest_forward.
+        Returns:
+            delta of shape (N,K'), K' <= k, padded with -inf
+            psi: list of tuple(prev_states, prev_ranks), each of shape
+                of the delta at that observation.
+            keys of shape of delta, None for first order models.
+        """
+        obs = self.encode(sequence)
+        delta = self.viterbi_start(obs[0])[:, np.newaxis]
+        keys = None
+        if(self._order > 1):
+            keys = self._state_to_single[:, np.newaxis]
+        psi = []
+        for t in range(1, len(obs)):
+            best, prev_states, prev_ranks = self._nbest_step(delta, keys, t, k)
+            if(keys is not None):
+                # the single state sequence of a path is that of the path it
+                # extends followed by the single state of its state
+                keys = keys[prev_states, prev_ranks] * self._num_single_states
+                keys += self._state_to_single[:, np.newaxis]
+                keys = np.unique(keys, return_inverse=True)[1].reshape(keys.shape)
+            delta = best + self._log_emissions[obs[t]][:, np.newaxis]
+            psi.append((prev_states, prev_ranks))
+        return delta, psi, keys
+
+    def _nbest_step(self, delta, keys, t, k):
+        """
+        One transition step of the list Viterbi algorithm. delta has shape
+        (N,K) holding the K best log probabilities of each state. Of the
+        candidates extending paths of equal keys, only the best is kept.
+        Returns:
+            k best log probabilities of reaching each state, before
+                emission, shape (N,k)
+            backpointers to the previous state and its rank, shape (N,k)
+        """
+        width = delta.shape[1]
+        if(t < self._order):
+            # transition does not depend on the previous state, so every
+            # state extends the k best paths overall
+            top, best = _top_k(
+                delta.reshape(1, -1),
+                k,
+                None if keys is None else keys.reshape(1, -1)
+            )
+            scores = best + self._log_pi[t][:, np.newaxis]
+            top = np.broadcast_to(top, scores.shape)
+            return scores, top // width, top % width
+
+        if(self._sparse):
+            # candidates of state s: (j-th predecessor, rank r) at j*K + r
+            scores = delta[self._pred_index] + self._log_pred_A[:, :, np.newaxis]
+            scores = scores.reshape(self._num_states, -1)
+            candidate_keys = None
+            if(keys is not None):
+                candidate_keys = keys[self._pred_index].reshape(scores.shape)
+            top, best = _top_k(scores, k, candidate_keys)
+            prev_states = np.take_along_axis(self._pred_index, top // width, axis=1)
+            return best, prev_states, top % width
+
+        # the k best over previous states for each rank, then over ranks,
+        # to avoid an (N,N*K) matrix of candidates
+        tops = []
+        bests = []
+        for rank in range(width):
+            scores = (delta[:, rank][:, np.newaxis] + self._log_A).T
+            candidate_keys = None
+            if(keys is not None):
+                candidate_keys = np.broadcast_to(keys[:, rank], scores.shape)
+            top, best = _top_k(scores, k, candidate_keys)
+            tops.append(top * width + rank)
+            bests.append(best)
+        top = np.concatenate(tops, axis=1)
+        candidate_keys = None
+        if(keys is not None):
+            candidate_keys = keys[top // width, top % width]
+        best_top, best = _top_k(np.concatenate(bests, axis=1), k, candidate_keys)
+        top = np.take_along_axis(top, best_top, axis=1)
+        return best, top // width, top % width
+
+    def viterbi_backward(self, delta, psi):
+        """ Decode by following the backpointers of psi """
+        return [self._state_names[s] for s in self.viterbi_path(delta, psi)]
+
+    def viterbi_path(self, delta, psi):
+        """ state index at each observation of the best path, shape (T,) """
+        columns = psi.shape[0]
+        path = np.zeros(columns, dtype=np.intp)
+        path[-1] = np.argmax(delta)
+        for t in range(columns - 1, 0, -1):
+            path[t - 1] = psi[t, path[t]]
+        return path
+
+    def evaluate_many(self, sequences, batch_size):
+        """ probability of each sequence, shape (len(sequences),) """
+        return np.exp(self.evaluate_log_many(sequences, batch_size))
+
+    def evaluate_log_many(self, sequences, batch_size):
+        """ log probability of each sequence, shape (len(sequences),) """
+        log_probs = np.full(len(sequences), -np.inf)
+        for indices, obs, lengths in self._buckets(sequences, batch_size):
+            log_probs[indices] = self._forward_batch(obs, lengths)
+        return log_probs
+
+    def decode_many(self, sequences, batch_size):
+        """ hidden state sequence of each sequence """
+        decoded = [[] for seq in sequences]
+        for indices, obs, lengths in self._buckets(sequences, batch_size):
+            paths = self._viterbi_batch(obs, lengths)
+            for i, path, length in zip(indices, paths, lengths):
+                decoded[i] = [self._state_names[s] for s in path[:length]]
+        return decoded
+
+    def _buckets(self, sequences, batch_size):
+        """
+        Sorts sequences by length and yields buckets of at most batch_size
+        non-empty sequences.
+        Yields:
+            indices: position of each bucket member in sequences, shape (B,)
+            obs: observation indices padded with 0, shape (B,T)
+            lengths: unpadded length of each member, shape (B,)
+        """
+        if(batch_size < 1):
+            raise ValueError("batch_size must be 1 or greater.")
+
+        all_lengths = np.array([len(seq) for seq in sequences], dtype=np.intp)
+        by_length = np.argsort(all_lengths, kind='mergesort')
+        by_length = by_length[all_lengths[by_length] > 0]
+        for start in range(0, len(by_length), batch_size):
+            indices = by_length[start:start + batch_size]
+            lengths = all_lengths[indices]
+            obs = np.zeros((len(indices), lengths[-1]), dtype=np.intp)
+            for row, i in enumerate(indices):
+                obs[row, :lengths[row]] = self.encode(sequences[i])
+            yield indices, obs, lengths
+
+    def _forward_batch(self, obs, lengths):
+        """
+        Scaled forward algorithm across a padded bucket. Rows whose sequence
+        has ended are masked out so their alpha and log probability freeze.
+        Returns:
+            log probability of each row, shape (B,)
+        """
+        alpha = self._forward_pi * self._forward_B[obs[:, 0]]
+        log_probs = self._scale_rows(alpha)
+
+        for t in range(1, obs.shape[1]):
+            if(t < self._order):
+                alpha_t = alpha.sum(axis=1)[:, np.newaxis] * self._pi[t]
+            else:
+                alpha_t = self._propagate(alpha)
+            alpha_t *= self._emissions[obs[:, t]]
+
+            live = t < lengths
+            log_probs[live] += self._scale_rows(alpha_t)[live]
+            alpha[live] = alpha_t[live]
+
+        return log_probs
+
+    def _scale_rows(self, alpha):
+        """ Normalizes each row of alpha in place. Returns the log normalizers """
+        totals = alpha.sum(axis=1)
+        nonzero = totals > 0
+        alpha[nonzero] /= totals[nonzero][:, np.newaxis]
+        with np.errstate(divide='ignore'):
+            return np.log(totals)
+
+    def _viterbi_batch(self, obs, lengths):
+        """
+        Log space Viterbi algorithm across a padded bucket.
+        Returns:
+            state index paths padded to the bucket length, shape (B,T)
+        """
+        rows, columns = obs.shape
+        num_states = self._num_states
+        batch_range = np.arange(rows)
+        psi = np.zeros((rows, columns, num_states), dtype=np.intp)
+
+        # initialization step
+        delta = self._log_pi[0] + self._log_emissions[obs[:, 0]]
+
+        # iterative step
+        for t in range(1, columns):
+            if(t < self._order):
+                best = np.argmax(delta, axis=1)
+                psi[:, t] = best[:, np.newaxis]
+                delta_t = delta[batch_range, best][:, np.newaxis] + self._log_pi[t]
+            else:
+                delta_t, psi[:, t] = self._max_step(delta)
+            delta_t += self._log_emissions[obs[:, t]]
+
+            live = t < lengths
+            delta[live] = delta_t[live]
+
+        # backtrack from the final observation of each row
+        paths = np.zeros((rows, columns), dtype=np.intp)
+        current = np.argmax(delta, axis=1)
+        for t in range(columns - 1, -1, -1):
+            if(t < columns - 1):
+                stepped = t + 1 < lengths
+                current = np.where(
+                    stepped, psi[batch_range, t + 1, current], current
+                )
+            paths[:, t] = current
+
+        return paths
+
+def _top_k(scores, k, keys=None):
+    """
+    Column indices and values of the k largest values of each row of
+    scores, largest first. If keys of the shape of scores are given, only
+    the largest value of each key in a row is considered.
+    """
+    if(keys is not None):
+        # sort each row by key, then by descending score
+        order = np.lexsort((-scores, keys), axis=-1)
+        sorted_keys = np.take_along_axis(keys, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        scores[:, 1:][sorted_keys[:, 1:] == sorted_keys[:, :-1]] = -np.inf
+        top, best = _top_k(scores, k)
+        return np.take_along_axis(order, top, axis=1), best
+
+    if(scores.shape[1] > k):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    best = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-best, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(best, order, axis=1)
+
+class _StateColumns:
+    """
+    Read-only table indexed [observation][state] over a matrix indexed
+    [single state][observation], such as B. Looking up observations
+    gathers their column for every state instead of keeping a (V,N) copy.
+    """
+    def __init__(self, matrix, rows):
+        """
+        Args:
+            matrix (ndarray): shape (S,V).
+            rows (ndarray): row of matrix of each state, shape (N,).
+        """
+        self._columns = matrix.T
+        self._rows = rows
+        if(len(rows) == matrix.shape[0] and (rows == np.arange(len(rows))).all()):
+            self._rows = None
+
+    def __getitem__(self, obs):
+        """ values of each state, on the last axis, at observation indices obs """
+        columns = self._columns[obs]
+        if(self._rows is None):
+            return columns
+        return columns[..., self._rows]
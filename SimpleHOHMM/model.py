@@ -1,11 +1,24 @@
 from __future__ import print_function
 
-from itertools import chain
-from math import log
+from array import array
+from heapq import heapify, heappop, heapreplace, nlargest
+from itertools import chain, islice
+from math import ceil, exp, log, sqrt
+from multiprocessing import Pool, cpu_count
+import random
+from timeit import default_timer
 
-from .utility import init_matrix, init_3d_matrix
+from .engine import ENGINES, NumpyEngine
+from .profiling import Profiler, timed
+from .states import CompositeStates
+from .statistics import SufficientStatistics
+from .storage import read_model, write_checkpoint, write_model
+from .utility import init_matrix, safe_log, NEG_INF
 
-class HiddenMarkovModel:
+DEFAULT_BATCH_SIZE = 256
+LEARN_METHODS = ("baum-welch", "viterbi")
+
+class HiddenMarkovModel(object):
     """
     Notation used:
         HMM: Hidden Markov Model
@@ -15,19 +28,56 @@ class HiddenMarkovModel:
         B: Observation emission probability distribution matrix
         pi: Initial state probability distribution vector
         lambda: A HMM comprised of (A,B,pi)
+    A is either dense, a list of rows list<float>, or sparse, a list of rows
+        dict<int:float> mapping the index of each reachable next state to
+        its probability. Sparse rows let higher order models store only
+        the valid successors of each state.
+    Engines:
+        'python': pure python lists. No dependencies.
+        'numpy': vectorized recursions over contiguous ndarrays.
+            Requires NumPy.
     """
-    def __init__(self, A, B, pi, all_obs, all_states, single_states=None, order=1):
-        if(single_states == None):
-            self._single_states = all_states
-        else:
-            self._single_states = single_states
-        self._all_states = all_states
-        self._all_obs = all_obs
-        self._A = A
-        self._B = B
-        self._pi = pi
-        self._highest_order = order
+    def __init__(self, A, B, pi, all_obs, all_states, single_states=None, order=1, engine="python"):
+        self._set_parameters(A, B, pi, all_obs, all_states, single_states, order, engine)
+        self._compile()
 
+    def __getstate__(self):
+        # a profiler stays with the process it was attached in
+        state = self.__dict__.copy()
+        state["_profiler"] = None
+        return state
+
+    @staticmethod
+    def load(path, mmap=True, engine=None):
+        """
+        Loads a model written by 'save'.
+        Args:
+            path (string): file to read.
+            mmap (boolean): map the file into memory instead of reading it.
+                Dense parameters are then read-only views of the file, so
+                loading is near-instant and processes loading the same
+                file share its pages through the OS page cache. Learning
+                first copies the parameters. Python 2 always reads and
+                copies the parameters.
+            engine (string): compute engine of the model, either 'python'
+                or 'numpy'. Defaults to the engine of the saved model.
+        Returns:
+            HiddenMarkovModel
+        """
+        return HiddenMarkovModel._from_stored(read_model(path, mmap), engine)
+
+    def save(self, path):
+        """
+        Writes the model to path in a compact binary format: a header
+        holding the vocabularies followed by aligned arrays of A, B, pi
+        and the log parameters. A sparse A is stored in compressed rows.
+        Vocabularies must be JSON serializable, such as strings.
+        Args:
+            path (string): file to write.
+        """
+        write_model(self, path)
+
+    @timed("evaluate")
     def evaluate(self, sequence):
         """
         Evaluation Problem: Calculate P(O|lambda).
@@ -42,36 +92,228 @@ class HiddenMarkovModel:
         if(len(sequence) == 0):
             return 0
 
-        alpha = self._forward(sequence)
-        fwd_probability = sum(map(
-            lambda s: alpha[s][len(sequence) - 1],
-            range(len(self._all_states)))
-        )
-        return fwd_probability
+        return exp(self._log_likelihood(sequence))
 
-    def decode(self, sequence):
+    @timed("evaluate_log")
+    def evaluate_log(self, sequence):
+        """
+        Evaluation Problem in log space: Calculate log P(O|lambda).
+            Uses the scaled forward algorithm so that sequences of any
+            length can be evaluated without underflow.
+        Args:
+            sequence (list<char>): observation sequence O
+        Returns:
+            float: natural log probability of sequence being emitted.
+                Negative infinity if the sequence cannot be emitted.
+        """
+        self._check_legal_sequence(sequence)
+        return self._log_likelihood(sequence)
+
+    @timed("decode")
+    def decode(self, sequence, beam=None, threshold=None, low_memory=False):
         """
         Decoding Problem: Given O and lambda, find S such that S 'best'
             describes O using lambda. Uses the Viterbi Algorithm.
+        Setting beam and/or threshold switches to beam search: after each
+            observation only the most probable partial paths are kept and
+            expanded, trading exactness for speed on large state spaces.
         Args:
             sequence (list<char>): observation sequence O
+            beam (int): keep at most this many states per observation.
+            threshold (float): keep only states whose path probability is
+                at least threshold times that of the best state. Value
+                should be between (0.0, 1.0].
+            low_memory (boolean): use a checkpointed Viterbi Algorithm
+                that keeps O(N * sqrt(T)) values instead of O(N * T)
+                backpointers for T observations and N states, taking about
+                twice as long. Meant for sequences of millions of
+                observations. Cannot be combined with beam or threshold.
         Returns:
             list<string>: hidden state sequence S
+            If beam or threshold is set: tuple(list<string>, boolean) of the
+                hidden state sequence S and whether the search was exact,
+                meaning no reachable state was ever pruned.
         """
         self._check_legal_sequence(sequence)
+        if(beam is not None or threshold is not None):
+            if(low_memory):
+                raise ValueError("low_memory cannot be combined with beam search.")
+            if(beam is not None and beam < 1):
+                raise ValueError("beam must be 1 or greater.")
+            if(threshold is not None and not 0 < threshold <= 1):
+                raise ValueError("threshold must be between (0.0, 1.0].")
+            if(len(sequence) == 0):
+                return [], True
+            return self._viterbi_beam(sequence, beam, threshold)
+
         if(len(sequence) == 0):
             return []
+        if(low_memory):
+            path = self._viterbi_low_memory(sequence)[0]
+            return [self._single_state_name(s_index) for s_index in path]
         return self._viterbi(sequence)
 
-    def learn(self, sequences, delta=0.0001, k_smoothing=0.0, iterations=-1):
+    @timed("decode_nbest")
+    def decode_nbest(self, sequence, n):
+        """
+        Decoding Problem for the n best hidden state sequences S given O
+            and lambda, found in a single pass of the list Viterbi
+            Algorithm: every state keeps its n best partial paths instead
+            of one.
+        Different paths through higher order states can describe the same
+            sequence of single states. Such paths are merged as they are
+            found, so each sequence is returned once.
+        Args:
+            sequence (list<char>): observation sequence O
+            n (int): number of hidden state sequences to return.
+        Returns:
+            list<tuple(list<string>, float)>: up to n pairs of hidden state
+                sequence S and its log probability log P(O,S|lambda), best
+                first. Sequences of probability 0 are not returned.
+        """
+        self._check_legal_sequence(sequence)
+        if(n < 1):
+            raise ValueError("n must be 1 or greater.")
+        if(len(sequence) == 0):
+            return []
+
+        return [
+            ([self._single_state_name(s_index) for s_index in path], score)
+            for score, path in self._viterbi_nbest(sequence, n)
+        ]
+
+    @timed("posteriors")
+    def posteriors(self, sequence):
+        """
+        Posterior marginals: the probability of each single hidden state
+            at each observation given O and lambda, P(s at t|O,lambda).
+            Computed by one pass of the forward-backward algorithm, so
+            confidences of every position cost about two evaluations.
+        Args:
+            sequence (list<char>): observation sequence O
+        Returns:
+            list<list<float>>: posteriors[t][i] is the probability of
+                single state self._single_states[i] at observation t. Rows
+                are 0 if the sequence cannot be emitted. An ndarray of
+                shape (T,S) with the 'numpy' engine.
+        """
+        self._check_legal_sequence(sequence)
+        return self._posteriors(sequence)
+
+    @timed("posteriors_many")
+    def posteriors_many(self, sequences, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Posterior marginals of many observation sequences at once. With
+            the 'numpy' engine, forward-backward runs over padded buckets
+            of sequences like evaluate_many.
+        Args:
+            sequences (list<O>): observation sequences O
+            batch_size (int): maximum number of sequences per bucket.
+        Returns:
+            list: posteriors of each sequence in the order given, see
+                'posteriors'.
+        """
+        self._check_legal_sequence(set(chain.from_iterable(sequences)))
+        if(self._engine is not None):
+            return self._engine.posteriors_many(sequences, batch_size)
+        return list(map(self._posteriors, sequences))
+
+    @timed("decode_posterior")
+    def decode_posterior(self, sequence):
+        """
+        Decoding Problem by posterior decoding: the single state of
+            highest posterior probability at each observation. Maximizes
+            the expected number of correct states rather than the
+            probability of the whole sequence as Viterbi does, so the
+            result may contain transitions of probability 0.
+        Args:
+            sequence (list<char>): observation sequence O
+        Returns:
+            list<string>: hidden state sequence S
+        """
+        self._check_legal_sequence(sequence)
+        return [
+            self._single_states[max(range(len(row)), key=row.__getitem__)]
+            for row in self._posteriors(sequence)
+        ]
+
+    @timed("evaluate_many")
+    def evaluate_many(self, sequences, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Evaluation Problem for many observation sequences at once.
+            With the 'numpy' engine, sequences are sorted by length and
+            grouped into buckets of at most batch_size. Each bucket is
+            padded and masked so the forward algorithm runs over the
+            whole bucket at every time step.
+        Args:
+            sequences (list<O>): observation sequences O
+            batch_size (int): maximum number of sequences per bucket.
+        Returns:
+            list<float>: probability of each sequence being emitted, in the
+                order given. An ndarray with the 'numpy' engine.
+        """
+        self._check_legal_sequence(set(chain.from_iterable(sequences)))
+        if(self._engine is not None):
+            return self._engine.evaluate_many(sequences, batch_size)
+        return [exp(self._log_likelihood(seq)) for seq in sequences]
+
+    @timed("evaluate_log_many")
+    def evaluate_log_many(self, sequences, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Same as evaluate_many but returns log P(O|lambda) of each sequence.
+        Args:
+            sequences (list<O>): observation sequences O
+            batch_size (int): maximum number of sequences per bucket.
+        Returns:
+            list<float>: natural log probability of each sequence being
+                emitted. An ndarray with the 'numpy' engine.
+        """
+        self._check_legal_sequence(set(chain.from_iterable(sequences)))
+        if(self._engine is not None):
+            return self._engine.evaluate_log_many(sequences, batch_size)
+        return list(map(self._log_likelihood, sequences))
+
+    @timed("decode_many")
+    def decode_many(self, sequences, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Decoding Problem for many observation sequences at once. Bucketed
+            like evaluate_many when using the 'numpy' engine.
+        Args:
+            sequences (list<O>): observation sequences O
+            batch_size (int): maximum number of sequences per bucket.
+        Returns:
+            list<list<string>>: hidden state sequence S of each sequence,
+                in the order given.
+        """
+        self._check_legal_sequence(set(chain.from_iterable(sequences)))
+        if(self._engine is not None):
+            return self._engine.decode_many(sequences, batch_size)
+        return [
+            self._viterbi(seq) if len(seq) > 0 else []
+            for seq in sequences
+        ]
+
+    @timed("learn")
+    def learn(self, sequences, delta=0.0001, k_smoothing=0.0, iterations=-1, n_jobs=1, callback=None, method="baum-welch", checkpoint=None, checkpoint_every=None, checkpoint_seconds=None, resume_from=None, low_memory=False):
         """
         Learning Problem: Reestimate the model parameters (A,B,pi) iteratively
             using the Baum-Welch Algorithm (EM). Maximize P(O|lambda).
+            Each iteration accumulates the expected counts of every
+            sequence (E-step) and then re-estimates (A,B,pi) once (M-step).
+            The forward pass of the E-step also scores the current
+            parameters, so convergence is checked without extra passes.
+        With method 'viterbi', learning is Viterbi training (hard EM)
+            instead: the counts are those of the most probable state path
+            of each sequence, so neither the backward pass nor xi are
+            computed. Learning stops once the decoded paths no longer
+            change, which usually takes few iterations. Maximizes
+            P(O,S|lambda) of the best paths S rather than P(O|lambda).
         It should be known that pi is currently not fully updated for HMMs
             of order greater than one.
         Args:
             sequences (list<O>): list of observations O = (O1,O2,...On) used
-                to train the initial (A,B,pi) parameters.
+                to train the initial (A,B,pi) parameters. Each must hold at
+                least one observation.
             delta (float): log value of iterative improvement such that when
                 evaluation probabilities improve by less than delta the
                 learning process is complete.
@@ -80,36 +322,225 @@ class HiddenMarkovModel:
             iterations (int): number of iterations to perform. Will return
                 if convergence is found before all iterations
                 have been performed.
+            n_jobs (int): number of worker processes the E-step is spread
+                over. 1 runs in the current process, -1 uses every CPU.
+            callback (function): called each time the parameters are scored
+                as callback(iteration, log_likelihood, delta, elapsed):
+                iteration (int): re-estimations made so far, from 0.
+                log_likelihood (float): average log P(O|lambda) of the
+                    sequences, the score convergence is checked on.
+                delta (float): change of the score since the previous
+                    call. None on the first call.
+                elapsed (float): seconds since learning started.
+                With method 'viterbi' the score is the average log
+                P(O,S|lambda) of the decoded paths.
+            method (string): 'baum-welch' or 'viterbi'.
+            checkpoint (string): file to save the parameters and the
+                progress of learning to after re-estimations, replacing
+                the previous checkpoint. It can be loaded as a model with
+                'load' or continued with resume_from.
+            checkpoint_every (int): re-estimations between checkpoints.
+            checkpoint_seconds (float): save a checkpoint after the first
+                re-estimation finishing this many seconds after the
+                previous checkpoint. If neither checkpoint_every nor
+                checkpoint_seconds are set, every re-estimation is saved.
+            resume_from (string): checkpoint of an interrupted learn of
+                this model to continue from. The saved parameters, score,
+                iteration count and state of the 'random' module are
+                restored, so with the same sequences, arguments and n_jobs
+                learning ends exactly as if it had not been interrupted.
+            low_memory (boolean): run the E-step with the checkpointed
+                forward-backward algorithm, which keeps O(N * sqrt(T))
+                instead of O(N * T) values per sequence of T observations
+                and N states for about one more forward pass. Suited to
+                very long sequences. Parameters learned match up to
+                rounding. With method 'viterbi', sequences are decoded as
+                by decode(low_memory=True).
         Returns:
-            (int): number of iterations to achieve convergence.
+            (int): number of iterations to achieve convergence, including
+                those made before resuming.
         """
+        if(method not in LEARN_METHODS):
+            raise ValueError(
+                "method must be one of: " + ", ".join(LEARN_METHODS)
+            )
+        start_time = default_timer()
         self._check_legal_sequence(set(chain.from_iterable(sequences)))
+        self._check_nonempty_sequences(sequences)
         num_sequences = len(sequences)
 
         cur_iterations = 0
         if(num_sequences == 0):
             return cur_iterations
+        if(checkpoint_every is not None and checkpoint_every < 1):
+            raise ValueError("checkpoint_every must be greater than 0.")
+        if(checkpoint_every is None and checkpoint_seconds is None):
+            checkpoint_every = 1
 
-        prior_score = sum(map(
-            lambda O: log(self.evaluate(O)),
-            sequences
-        )) / num_sequences
+        if(n_jobs == -1):
+            n_jobs = cpu_count()
+        if(n_jobs < 1):
+            raise ValueError("n_jobs must be -1 or greater than 0.")
+        n_jobs = min(n_jobs, num_sequences)
+        pool = Pool(n_jobs) if n_jobs > 1 else None
 
-        while True:
-            for seq in sequences:
-                self._train(seq, k_smoothing)
+        try:
+            if(resume_from is None):
+                stats, paths = self._e_step(sequences, pool, n_jobs, method, low_memory)
+                prior_score = stats.log_likelihood / num_sequences
+                if(callback is not None):
+                    callback(0, prior_score, None, default_timer() - start_time)
+            else:
+                # continues right after the M-step that was saved
+                stats = None
+                cur_iterations, prior_score, paths, elapsed = self._resume(resume_from)
+                start_time -= elapsed
+            last_checkpoint = default_timer()
 
-            cur_iterations += 1
-            new_score = sum(map(
-                lambda O: log(self.evaluate(O)),
-                sequences
-            )) / num_sequences
+            while True:
+                if(stats is not None):
+                    self._m_step(stats, k_smoothing)
 
-            if(abs(prior_score - new_score) < delta):
-                break
-            if(iterations > -1 and cur_iterations >= iterations):
-                break
-            prior_score = new_score
+                    cur_iterations += 1
+                    if(self._profiler is not None):
+                        self._profiler.count("iterations")
+                    if(checkpoint is not None and (
+                        (checkpoint_every is not None and cur_iterations % checkpoint_every == 0)
+                        or (checkpoint_seconds is not None and default_timer() - last_checkpoint >= checkpoint_seconds)
+                    )):
+                        self._save_checkpoint(
+                            checkpoint,
+                            cur_iterations,
+                            prior_score,
+                            paths,
+                            default_timer() - start_time
+                        )
+                        last_checkpoint = default_timer()
+                if(iterations > -1 and cur_iterations >= iterations):
+                    break
+
+                # scores the updated parameters and prepares the next M-step
+                prior_paths = paths
+                stats, paths = self._e_step(sequences, pool, n_jobs, method, low_memory)
+                new_score = stats.log_likelihood / num_sequences
+                if(callback is not None):
+                    callback(
+                        cur_iterations,
+                        new_score,
+                        new_score - prior_score,
+                        default_timer() - start_time
+                    )
+
+                if(method == "viterbi"):
+                    if(paths == prior_paths):
+                        break
+                elif(prior_score == new_score or abs(prior_score - new_score) < delta):
+                    break
+                prior_score = new_score
+        finally:
+            if(pool is not None):
+                pool.close()
+                pool.join()
+
+        return cur_iterations
+
+    @timed("learn_online")
+    def learn_online(self, sequences, batch_size=DEFAULT_BATCH_SIZE, k_smoothing=0.0, step_decay=0.7, step_offset=2.0, passes=1, n_jobs=1, callback=None, method="baum-welch", low_memory=False):
+        """
+        Learning Problem solved with online (stepwise) EM, for corpora that
+            do not fit in memory. Sequences are read in mini-batches and
+            only one batch is held at a time. The counts of each batch
+            (E-step) are blended into running counts with the step size
+                eta_k = (k + step_offset) ^ -step_decay
+            for the k-th batch, the first batch replacing the running
+            counts, and (A,B,pi) are re-estimated from the running counts
+            after every batch (M-step). Each batch is scored by the
+            parameters it is about to update.
+        Args:
+            sequences (iterable<O>): observation sequences O, such as a
+                generator reading them from a file. Must be iterable
+                again, such as a list, if passes > 1. Each must hold at
+                least one observation.
+            batch_size (int): number of sequences per mini-batch.
+            k_smoothing (float): Smoothing parameter for add-k smoothing to
+                avoid zero probability. Value should be between [0.0, 1.0].
+            step_decay (float): how quickly the step size decays, between
+                (0.5, 1.0]. Larger values weigh earlier batches more.
+            step_offset (float): delays the decay of the step size. Must
+                not be negative.
+            passes (int): number of passes over the sequences.
+            n_jobs (int): number of worker processes the E-step of each
+                batch is spread over, see 'learn'.
+            callback (function): called after the E-step of each batch as
+                callback(iteration, log_likelihood, delta, elapsed), see
+                'learn'. The score is that of the batch.
+            method (string): 'baum-welch' or 'viterbi', see 'learn'.
+            low_memory (boolean): see 'learn'.
+        Returns:
+            (int): number of re-estimations made, one per batch.
+        """
+        if(method not in LEARN_METHODS):
+            raise ValueError(
+                "method must be one of: " + ", ".join(LEARN_METHODS)
+            )
+        if(batch_size < 1):
+            raise ValueError("batch_size must be greater than 0.")
+        if(not 0.5 < step_decay <= 1):
+            raise ValueError("step_decay must be between (0.5, 1.0].")
+        if(step_offset < 0):
+            raise ValueError("step_offset must not be negative.")
+        if(passes > 1 and iter(sequences) is sequences):
+            raise ValueError("sequences must be iterable again for passes > 1.")
+        if(n_jobs == -1):
+            n_jobs = cpu_count()
+        if(n_jobs < 1):
+            raise ValueError("n_jobs must be -1 or greater than 0.")
+
+        start_time = default_timer()
+        n_jobs = min(n_jobs, batch_size)
+        pool = Pool(n_jobs) if n_jobs > 1 else None
+        running = None
+        prior_score = None
+        cur_iterations = 0
+        try:
+            for i in range(passes):
+                batches = iter(sequences)
+                while(True):
+                    batch = list(islice(batches, batch_size))
+                    if(len(batch) == 0):
+                        break
+                    self._check_legal_sequence(set(chain.from_iterable(batch)))
+                    self._check_nonempty_sequences(batch)
+
+                    stats, paths = self._e_step(
+                        batch, pool, min(n_jobs, len(batch)), method, low_memory
+                    )
+                    score = stats.log_likelihood / len(batch)
+                    if(callback is not None):
+                        callback(
+                            cur_iterations,
+                            score,
+                            None if prior_score is None else score - prior_score,
+                            default_timer() - start_time
+                        )
+                    prior_score = score
+
+                    if(running is None):
+                        running = stats
+                    else:
+                        running.blend(
+                            stats,
+                            (cur_iterations + step_offset) ** -step_decay
+                        )
+                    self._m_step(running, k_smoothing)
+
+                    cur_iterations += 1
+                    if(self._profiler is not None):
+                        self._profiler.count("iterations")
+        finally:
+            if(pool is not None):
+                pool.close()
+                pool.join()
 
         return cur_iterations
 
@@ -134,15 +565,128 @@ class HiddenMarkovModel:
         for i, parameter in enumerate([self._pi, self._A, self._B]):
             print(names[i])
             for element in parameter:
-                print(element)
+                print(element if isinstance(element, (dict, list)) else list(element))
+
+    def set_profiler(self, profiler):
+        """
+        Attaches a profiler that records the latency of evaluate, decode
+        and learn, and the time spent in each phase of learn.
+        Args:
+            profiler (Profiler): profiler to record into. None detaches.
+        """
+        self._profiler = profiler
 
     # ----------------- #
     #      Private      #
     # ----------------- #
 
+    def _set_parameters(self, A, B, pi, all_obs, all_states, single_states, order, engine):
+        if(engine not in ENGINES):
+            raise ValueError("engine must be one of: " + ", ".join(ENGINES))
+        if(single_states == None):
+            self._single_states = all_states
+        else:
+            self._single_states = single_states
+        self._all_states = all_states
+        self._all_obs = all_obs
+        self._A = A
+        self._B = B
+        self._pi = pi
+        self._highest_order = order
+        self._engine_name = engine
+        self._engine = None
+        self._read_only = False
+        self._profiler = None
+
+        # composite states are parsed once into mixed-radix codes
+        self._state_space = CompositeStates(self._single_states)
+        self._state_codes = [
+            self._state_space.parse(state, order) for state in all_states
+        ]
+
+    @staticmethod
+    def _from_stored(stored, engine=None):
+        """
+        Model viewing the parameters read by storage.read_model. The
+        stored log parameters are used as is rather than recomputed.
+        """
+        hmm = HiddenMarkovModel.__new__(HiddenMarkovModel)
+        hmm._set_parameters(
+            stored["A"],
+            stored["B"],
+            stored["pi"],
+            stored["all_obs"],
+            stored["all_states"],
+            stored["single_states"],
+            stored["order"],
+            stored["engine"] if engine is None else engine
+        )
+        hmm._read_only = True
+        hmm._compile(stored["log_A"], stored["log_B"])
+        return hmm
+
+    def _compile(self, log_A=None, log_B=None):
+        """
+        Precomputes lookup tables derived from the model parameters such
+        that the algorithms only perform O(1) integer lookups. Histories of
+        states are found from their codes, see CompositeStates:
+            _obs_index: observation => index into self._all_obs
+            _state_to_single: state index => index of its order 1 state
+                in self._single_states
+            _pi_lookup: _pi_lookup[t][s] is the starting probability of
+                the order (t + 1) history of state s
+            _log_A, _log_B, _log_pi_lookup: log parameters for Viterbi
+        Must be called whenever (A,B,pi) change.
+        Args:
+            log_A, log_B: log parameters to use instead of computing them.
+        """
+        self._obs_index = dict(
+            (obs, o_index) for o_index, obs in enumerate(self._all_obs)
+        )
+        space = self._state_space
+        self._state_to_single = [
+            space.project(code, 1) for code in self._state_codes
+        ]
+        self._pi_lookup = [[
+            self._pi[0][self._single_states[s_single]]
+            for s_single in self._state_to_single
+        ]]
+        for t_index in range(1, self._highest_order):
+            pi_by_code = dict(
+                (space.parse(state, t_index + 1), prob)
+                for state, prob in self._pi[t_index].items()
+            )
+            self._pi_lookup.append([
+                pi_by_code[space.project(code, t_index + 1)]
+                for code in self._state_codes
+            ])
+
+        self._sparse = len(self._A) > 0 and isinstance(self._A[0], dict)
+        if(log_A is not None):
+            self._log_A = log_A
+        elif(self._sparse):
+            self._log_A = [
+                dict((s_prime, safe_log(p)) for s_prime, p in row.items())
+                for row in self._A
+            ]
+        else:
+            self._log_A = [list(map(safe_log, row)) for row in self._A]
+        if(log_B is not None):
+            self._log_B = log_B
+        else:
+            self._log_B = [list(map(safe_log, row)) for row in self._B]
+        self._log_pi_lookup = [
+            list(map(safe_log, pi_row)) for pi_row in self._pi_lookup
+        ]
+
+        if(self._engine_name == "numpy"):
+            self._engine = NumpyEngine(self, log_A, log_B)
+        else:
+            self._engine = None
+
     def _check_legal_sequence(self, seq):
         """ Throws ValueError if an element of seq is not in self._all_obs """
-        illegal_obs = list([x for x in seq if x not in self._all_obs])
+        illegal_obs = list([x for x in seq if x not in self._obs_index])
         if(len(illegal_obs) == 0):
             return True
 
@@ -152,299 +696,1124 @@ class HiddenMarkovModel:
             msg = "Observations out of vocabulary: '"
         raise ValueError(msg + ", ".join(illegal_obs) + "'")
 
+    def _check_nonempty_sequences(self, sequences):
+        """ Throws ValueError if a training sequence is empty """
+        if(any(len(sequence) == 0 for sequence in sequences)):
+            raise ValueError("Training sequences must not be empty.")
+
+    def _log_likelihood(self, sequence):
+        """ log P(O|lambda) of an already validated sequence """
+        if(len(sequence) == 0):
+            return NEG_INF
+
+        alpha, scales = self._forward(sequence)
+        return sum(map(safe_log, scales))
+
+    def _encode(self, sequence):
+        """ Maps an observation sequence to indices of self._all_obs """
+        return [self._obs_index[obs] for obs in sequence]
+
+    def _init_like_A(self, make_value):
+        """ A matrix shaped like A, dense or sparse, filled by make_value() """
+        if(self._sparse):
+            return [
+                dict((s_prime, make_value()) for s_prime in row)
+                for row in self._A
+            ]
+        return [[make_value() for p in row] for row in self._A]
+
+    def _successors(self, matrix, s_index):
+        """
+        (next state index, value) pairs of row s_index of a transition
+        matrix shaped like A, either dense or sparse.
+        """
+        if(self._sparse):
+            return matrix[s_index].items()
+        return enumerate(matrix[s_index])
+
     def _forward(self, sequence):
+        """
+        Scaled forward algorithm. Each column of alpha is normalized to
+        sum to 1 and the normalizer is kept such that
+        P(O|lambda) = product(scales).
+        Returns:
+            alpha (rows: states, columns: observations), scales (list<float>)
+        """
+        if(self._engine is not None):
+            return self._engine.forward(sequence)
+
         rows = len(self._all_states)
         columns = len(sequence)
+        obs_indices = self._encode(sequence)
         alpha = init_matrix(rows, columns, "float")
+        scales = [0.0] * columns
 
         # initialization step
-        for s_index, state in enumerate(self._single_states):
-            o_index = self._all_obs.index(sequence[0])
-            alpha[s_index][0] = (
-                self._pi[0][state]
-                * self._B[s_index][o_index]
-            )
+        column = self._forward_start(obs_indices[0])
+        for s_index in range(rows):
+            alpha[s_index][0] = column[s_index]
+        self._scale_column(alpha, 0, scales)
 
         # iterative step
-        for t_index in range(columns - 1):
-            obs = sequence[t_index + 1]
-            for s_index, state in enumerate(self._all_states):
-                single_state_index = self._single_states.index(
-                    self._get_state_by_order(state, 1)
-                )
-                for s_prime in range(len(self._all_states)):
-                    if(t_index + 1 < self._highest_order):
-                        state_by_order = self._get_state_by_order(
-                            self._all_states[s_index],
-                            t_index + 2
-                        )
-                        a_prob = self._pi[t_index + 1][state_by_order]
-                    else:
-                        a_prob = self._A[s_prime][s_index]
+        for t_index in range(1, columns):
+            column = self._forward_step(
+                [row[t_index - 1] for row in alpha],
+                t_index,
+                obs_indices[t_index]
+            )
+            for s_index in range(rows):
+                alpha[s_index][t_index] = column[s_index]
+            self._scale_column(alpha, t_index, scales)
 
-                    alpha[s_index][t_index + 1] += (
-                        alpha[s_prime][t_index]
-                        * a_prob
-                        * self._B[single_state_index][self._all_obs.index(obs)]
-                    )
+        return alpha, scales
+
+    def _forward_start(self, obs_index):
+        """
+        Initialization step of the forward algorithm.
+        Args:
+            obs_index (int): index of the first observation in self._all_obs
+        Returns:
+            list<float>: unscaled alpha of each state
+        """
+        if(self._engine is not None):
+            return self._engine.forward_start(obs_index)
 
-        return alpha
+        column = [0.0] * len(self._all_states)
+        for s_index, state in enumerate(self._single_states):
+            column[s_index] = self._pi[0][state] * self._B[s_index][obs_index]
+        return column
+
+    def _forward_step(self, prev_alpha, t_index, obs_index):
+        """
+        Iterative step of the forward algorithm.
+        Args:
+            prev_alpha (list<float>): alpha of each state at observation
+                t_index - 1
+            t_index (int): position of the observation in the sequence
+            obs_index (int): index of the observation in self._all_obs
+        Returns:
+            list<float>: unscaled alpha of each state at t_index
+        """
+        if(self._engine is not None):
+            return self._engine.forward_step(prev_alpha, t_index, obs_index)
+
+        rows = len(self._all_states)
+        if(t_index < self._highest_order):
+            prev_total = sum(prev_alpha)
+            totals = [prev_total * p for p in self._pi_lookup[t_index]]
+        else:
+            totals = [0.0] * rows
+            for s_prime in range(rows):
+                prev_prob = prev_alpha[s_prime]
+                if(prev_prob == 0):
+                    continue
+                for s_index, a_prob in self._successors(self._A, s_prime):
+                    totals[s_index] += prev_prob * a_prob
+
+        return [
+            totals[s_index] * self._B[self._state_to_single[s_index]][obs_index]
+            for s_index in range(rows)
+        ]
+
+    def _scale_column(self, alpha, t_index, scales):
+        """ Normalizes column t_index of alpha and records the normalizer """
+        total = sum(map(lambda row: row[t_index], alpha))
+        scales[t_index] = total
+        if(total == 0):
+            return
+
+        for row in alpha:
+            row[t_index] /= total
+
+    def _backward(self, sequence, scales):
+        """
+        Scaled backward algorithm using the normalizers of the forward pass
+        such that alpha[s][t] * beta[s][t] is proportional to P(s at t|O).
+        """
+        if(self._engine is not None):
+            return self._engine.backward(sequence, scales)
 
-    def _backward(self, sequence):
         rows = len(self._all_states)
         columns = len(sequence)
+        obs_indices = self._encode(sequence)
         beta = init_matrix(rows, columns, "float")
 
         # initialization step
-        for s_index, state in enumerate(self._all_states):
+        for s_index in range(rows):
             beta[s_index][-1] = 1
 
         # iterative step
-        for t_index in reversed(range(columns-1)):
-            obs = sequence[t_index + 1]
-            for s_index in range(len(self._all_states)):
-                for s_prime, state in enumerate(self._all_states):
-                    single_state_index = self._single_states.index(
-                        self._get_state_by_order(state, 1)
-                    )
-                    beta[s_index][t_index] += (
-                        beta[s_prime][t_index + 1]
-                        * self._A[s_index][s_prime]
-                        * self._B[single_state_index][self._all_obs.index(obs)]
-                    )
+        for t_index in reversed(range(columns - 1)):
+            column = self._backward_step(
+                [row[t_index + 1] for row in beta],
+                obs_indices[t_index + 1],
+                scales[t_index + 1]
+            )
+            for s_index in range(rows):
+                beta[s_index][t_index] = column[s_index]
 
         return beta
 
+    def _backward_step(self, next_beta, obs_index, scale):
+        """
+        Iterative step of the backward algorithm.
+        Args:
+            next_beta (list<float>): beta of each state at the next
+                observation.
+            obs_index (int): index of the next observation in self._all_obs
+            scale (float): normalizer of alpha at the next observation.
+        Returns:
+            list<float>: scaled beta of each state
+        """
+        rows = len(self._all_states)
+        weighted_beta = [
+            next_beta[s_prime]
+            * self._B[self._state_to_single[s_prime]][obs_index]
+            for s_prime in range(rows)
+        ]
+        scale = scale if scale != 0 else 1
+        column = [0.0] * rows
+        for s_index in range(rows):
+            total = 0.0
+            for s_prime, a_prob in self._successors(self._A, s_index):
+                total += a_prob * weighted_beta[s_prime]
+
+            column[s_index] = total / scale
+        return column
+
     def _viterbi(self, sequence):
         """
         Notation used:
-            delta: matrix holding the highest probability state path
-                at observation time t.
-            psi: backpointer matrix maintaining which state maximized delta.
+            delta: log probability of the highest probability state path
+                ending in each state at the current observation. Only the
+                current column is kept.
+            psi: backpointers maintaining which previous state maximized
+                delta, one array of state indices per observation.
         Args:
             sequence (list<char>): observation sequence O
         Returns:
             list<string>: hidden state sequence S
         """
+        if(self._engine is not None):
+            return self._engine.viterbi(sequence)
+
         delta, psi = self._viterbi_forward(sequence)
-        return self._viterbi_backward(delta, psi, sequence)
+        return self._viterbi_backward(delta, psi)
 
     def _viterbi_forward(self, sequence):
-        """ build probability quantities delta and backpointers psi """
-        rows = len(self._all_states)
-        columns = len(sequence)
-
-        delta = init_matrix(rows, columns, "int")
-        psi = init_matrix(rows, columns, 'int,int')
+        """
+        Returns:
+            list<float>: delta at the last observation.
+            list<array<int>>: psi, psi[t - 1][s] is the previous state of
+                the best path reaching state s at observation t.
+        """
+        obs_indices = self._encode(sequence)
 
         # initialization step
-        obs_index = self._all_obs.index(sequence[0])
-        for s_index, state in enumerate(self._all_states):
-            single_state = self._get_state_by_order(state, 1)
-            single_state_index = self._single_states.index(single_state)
-            delta[s_index][0] = (
-                self._pi[0][single_state]
-                * self._B[single_state_index][obs_index]
-            )
+        delta = self._viterbi_start(obs_indices[0])
 
         # iterative step
+        psi = []
+        for o_index in range(1, len(sequence)):
+            delta, rows_back = self._viterbi_step(
+                delta, o_index, obs_indices[o_index]
+            )
+            psi.append(array("i", rows_back))
+
+        return delta, psi
+
+    def _viterbi_start(self, obs_index):
+        """
+        Initialization step of the Viterbi Algorithm.
+        Args:
+            obs_index (int): index of the first observation in self._all_obs
+        Returns:
+            list<float>: log probability delta of each state
+        """
+        if(self._engine is not None):
+            return self._engine.viterbi_start(obs_index)
+
+        return [
+            self._log_pi_lookup[0][s_index]
+            + self._log_B[self._state_to_single[s_index]][obs_index]
+            for s_index in range(len(self._all_states))
+        ]
+
+    def _viterbi_step(self, prev_delta, t_index, obs_index):
+        """
+        Iterative step of the Viterbi Algorithm.
+        Args:
+            prev_delta (list<float>): log probability delta of each state
+                at observation t_index - 1
+            t_index (int): position of the observation in the sequence
+            obs_index (int): index of the observation in self._all_obs
+        Returns:
+            tuple(list<float>, list<int>): delta of each state at t_index
+                and the backpointer to the maximizing previous state.
+        """
+        if(self._engine is not None):
+            return self._engine.viterbi_step(prev_delta, t_index, obs_index)
+
+        rows = len(self._all_states)
+        emission_log_probs = [
+            self._log_B[self._state_to_single[s_index]][obs_index]
+            for s_index in range(rows)
+        ]
+        max_probs = [NEG_INF] * rows
+        rows_back = [0] * rows
+
+        for prev_s_index in range(rows):
+            # a probability of 0.0 nullfies the following computation
+            prev_prob = prev_delta[prev_s_index]
+            if prev_prob == NEG_INF:
+                continue
+
+            if(t_index < self._highest_order):
+                transitions = enumerate(self._log_pi_lookup[t_index])
+            else:
+                transitions = self._successors(self._log_A, prev_s_index)
+
+            for s_index, transition_log_prob in transitions:
+                cur_prob = (
+                    prev_prob
+                    + transition_log_prob
+                    + emission_log_probs[s_index]
+                )
+                if cur_prob > max_probs[s_index]:
+                    max_probs[s_index] = cur_prob
+                    rows_back[s_index] = prev_s_index
+
+        return max_probs, rows_back
+
+    def _viterbi_backward(self, delta, psi):
+        """ Decode by following the backpointers of psi """
+        return [
+            self._single_state_name(s_index)
+            for s_index in self._viterbi_path(delta, psi)
+        ]
+
+    def _viterbi_path(self, delta, psi):
+        """
+        Follows the backpointers of psi from the most probable final state.
+        Returns:
+            list<int>: index of the state at each observation
+        """
+        rev_path = [_argmax(delta)]
+        for rows_back in reversed(psi):
+            rev_path.append(rows_back[rev_path[-1]])
+
+        return rev_path[::-1]
+
+    def _viterbi_low_memory(self, sequence):
+        """
+        Checkpointed Viterbi Algorithm for very long sequences. Decoding a
+        sequence of T observations keeps O(N * sqrt(T)) values instead of
+        the O(N * T) backpointers: the forward pass keeps delta only at
+        the end of every ceil(sqrt(T))-th observation. The path is then
+        recovered one segment at a time, latest first, recomputing the
+        backpointers of the segment from its checkpoint. Each observation
+        is processed twice; the path is the same as that of _viterbi.
+        Args:
+            sequence (list<char>): non-empty observation sequence O
+        Returns:
+            tuple(list<int>, float): index of the state at each
+                observation and the log probability of the path.
+        """
+        columns = len(sequence)
+        obs_indices = self._encode(sequence)
+        interval = int(ceil(sqrt(columns)))
+
+        # checkpoints[i] is delta right before segment i + 1 starts
+        checkpoints = []
+        delta = self._viterbi_start(obs_indices[0])
         for o_index in range(1, columns):
-            o_master_index = self._all_obs.index(sequence[o_index])
-            for s_index, state in enumerate(self._all_states):
-                max_prob = 0
-                row_back = 0
-                col_back = 0
+            if(o_index % interval == 0):
+                checkpoints.append(delta)
+            delta, rows_back = self._viterbi_step(
+                delta, o_index, obs_indices[o_index]
+            )
+
+        path = [0] * columns
+        path[-1] = _argmax(delta)
+        log_prob = float(delta[path[-1]])
+        for first in reversed(range(0, columns, interval)):
+            if(first == 0):
+                delta = self._viterbi_start(obs_indices[0])
+            else:
+                delta = checkpoints[first // interval - 1]
+
+            # psi of the observations of the segment, see _viterbi_forward
+            psi = []
+            for o_index in range(max(first, 1), min(first + interval, columns)):
+                delta, rows_back = self._viterbi_step(
+                    delta, o_index, obs_indices[o_index]
+                )
+                psi.append(rows_back)
+
+            o_index = max(first, 1) + len(psi)
+            for rows_back in reversed(psi):
+                o_index -= 1
+                path[o_index - 1] = int(rows_back[path[o_index]])
+
+        return path, log_prob
+
+    def _best_path(self, sequence, low_memory=False):
+        """
+        Viterbi path of a non-empty sequence as state indices.
+        Args:
+            low_memory (boolean): use _viterbi_low_memory.
+        Returns:
+            tuple(list<int>, float): index of the state at each
+                observation and the log probability of the path.
+        """
+        if(low_memory):
+            return self._viterbi_low_memory(sequence)
+        if(self._engine is not None):
+            delta, psi = self._engine.viterbi_forward(sequence)
+            path = self._engine.viterbi_path(delta, psi)
+            return path.tolist(), float(delta[path[-1]])
+
+        delta, psi = self._viterbi_forward(sequence)
+        path = self._viterbi_path(delta, psi)
+        return path, delta[path[-1]]
+
+    def _viterbi_nbest(self, sequence, k):
+        """
+        k best paths through the states of the model, counting paths of
+        the same single state sequence once.
+        Returns:
+            list<tuple(float, list<int>)>: log probability and state index
+                path of up to k paths, best first.
+        """
+        if(self._engine is not None):
+            delta, psi, keys = self._engine.viterbi_nbest_forward(sequence, k)
+        else:
+            delta, psi, keys = self._viterbi_nbest_forward(sequence, k)
+        return self._viterbi_nbest_backward(delta, psi, keys, k)
+
+    def _viterbi_nbest_forward(self, sequence, k):
+        """
+        List Viterbi Algorithm. Like _viterbi_forward, but each state keeps
+        the k best paths reaching it that differ in their single states.
+        Notation used:
+            delta[s][r]: log probability of the r-th best path reaching
+                state s at the last observation, best first.
+            psi[t]: tuple(prev_states, prev_ranks) of backpointers at
+                observation t + 1. The path of delta[s][r] came from
+                state prev_states[s][r] by its prev_ranks[s][r]-th path.
+            keys[s][r]: integer identifying the single state sequence of
+                the path of delta[s][r] among the paths of the last
+                observation. None for first order models, where paths
+                are single state sequences.
+        Returns:
+            delta, psi, keys
+        """
+        rows = len(self._all_states)
+        obs_indices = self._encode(sequence)
 
-                single_state_index = self._single_states.index(self._get_state_by_order(state, 1))
-                emission_multiplier = self._B[single_state_index][o_master_index]
+        delta = [
+            [score] if score > NEG_INF else []
+            for score in self._viterbi_start(obs_indices[0])
+        ]
+        keys = None
+        if(self._highest_order > 1):
+            keys = [[s_single] for s_single in self._state_to_single]
+        psi = []
+        for t_index in range(1, len(sequence)):
+            obs_index = obs_indices[t_index]
+            emission_log_probs = [
+                self._log_B[self._state_to_single[s_index]][obs_index]
+                for s_index in range(rows)
+            ]
 
-                # a multiplier of 0.0 nullfies the following computation
-                if emission_multiplier == 0.0:
+            # the best extension from each previous state, grouped by state
+            heads = [[] for s_index in range(rows)]
+            for prev_s_index, prev_scores in enumerate(delta):
+                if(len(prev_scores) == 0):
                     continue
 
-                for prev_s_index in range(rows):
-                    transition_multiplier = 0
-                    if(o_index < self._highest_order):
-                        state_by_order = self._get_state_by_order(
-                            self._all_states[s_index],
-                            o_index + 1
-                        )
-                        transition_multiplier = self._pi[o_index][state_by_order]
-                    else:
-                        transition_multiplier = self._A[prev_s_index][s_index]
+                if(t_index < self._highest_order):
+                    transitions = enumerate(self._log_pi_lookup[t_index])
+                else:
+                    transitions = self._successors(self._log_A, prev_s_index)
+
+                for s_index, transition_log_prob in transitions:
+                    weight = transition_log_prob + emission_log_probs[s_index]
+                    if(weight == NEG_INF):
+                        continue
+                    heads[s_index].append(
+                        (-(prev_scores[0] + weight), prev_s_index, 0, weight)
+                    )
+
+            best_candidates = [
+                _merge_k_best(state_heads, delta, keys, k)
+                for state_heads in heads
+            ]
+            if(keys is not None):
+                ids = dict()
+                keys = [
+                    [
+                        ids.setdefault((keys[s_prev][rank], s_single), len(ids))
+                        for score, s_prev, rank in best
+                    ]
+                    for best, s_single in zip(best_candidates, self._state_to_single)
+                ]
+
+            delta = []
+            prev_states = []
+            prev_ranks = []
+            for best in best_candidates:
+                delta.append([score for score, s_index, rank in best])
+                prev_states.append([s_index for score, s_index, rank in best])
+                prev_ranks.append([rank for score, s_index, rank in best])
+            psi.append((prev_states, prev_ranks))
+
+        return delta, psi, keys
+
+    def _viterbi_nbest_backward(self, delta, psi, keys, k):
+        """ Follows the backpointers of the k best final paths """
+        finals = sorted([
+            (score, s_index, rank)
+            for s_index, scores in enumerate(delta)
+            for rank, score in enumerate(scores)
+            if score > NEG_INF
+        ], reverse=True)
+        if(keys is None):
+            finals = finals[:k]
+        else:
+            # final states of one single state sequence may differ
+            finals = _distinct(finals, keys, k)
+
+        paths = []
+        for score, s_index, rank in finals:
+            path = [s_index]
+            for prev_states, prev_ranks in reversed(psi):
+                s_index, rank = prev_states[s_index][rank], prev_ranks[s_index][rank]
+                path.append(s_index)
+            path.reverse()
+            paths.append((float(score), [int(s_index) for s_index in path]))
+        return paths
+
+    def _viterbi_beam(self, sequence, beam, threshold):
+        """
+        Viterbi Algorithm that only expands the states kept by _prune at
+        each observation. Backpointers are kept for expanded states only.
+        Returns:
+            tuple(list<string>, boolean): hidden state sequence S and
+                whether the search was exact.
+        """
+        obs_indices = self._encode(sequence)
+        exact = True
+
+        # initialization step
+        delta = dict()
+        for s_index, pi_log_prob in enumerate(self._log_pi_lookup[0]):
+            log_prob = (
+                pi_log_prob
+                + self._log_B[self._state_to_single[s_index]][obs_indices[0]]
+            )
+            if(log_prob > NEG_INF):
+                delta[s_index] = log_prob
+        delta, pruned = self._prune(delta, beam, threshold)
+        exact = exact and not pruned
 
+        # iterative step
+        psi = []
+        for o_index in range(1, len(sequence)):
+            log_B_column = [row[obs_indices[o_index]] for row in self._log_B]
+            next_delta = dict()
+            back = dict()
+            for prev_s_index in sorted(delta):
+                prev_delta = delta[prev_s_index]
+                if(o_index < self._highest_order):
+                    transitions = enumerate(self._log_pi_lookup[o_index])
+                else:
+                    transitions = self._successors(self._log_A, prev_s_index)
+
+                for s_index, transition_log_prob in transitions:
                     cur_prob = (
-                        delta[prev_s_index][o_index - 1]
-                        * transition_multiplier
-                        * emission_multiplier
+                        prev_delta
+                        + transition_log_prob
+                        + log_B_column[self._state_to_single[s_index]]
                     )
-                    if cur_prob > max_prob:
-                        max_prob = cur_prob
-                        row_back = prev_s_index
-                        col_back = o_index - 1
+                    if(cur_prob > next_delta.get(s_index, NEG_INF)):
+                        next_delta[s_index] = cur_prob
+                        back[s_index] = prev_s_index
 
-                delta[s_index][o_index] = max_prob
-                psi[s_index][o_index] = (row_back, col_back)
+            psi.append(back)
+            delta, pruned = self._prune(next_delta, beam, threshold)
+            exact = exact and not pruned
 
-        return delta, psi
+        # backtrack from the best surviving state
+        if(len(delta) == 0):
+            return [self._single_state_name(0)] * len(sequence), exact
+        s_index = max(sorted(delta), key=lambda s: delta[s])
+        rev_output = [self._single_state_name(s_index)]
+        for back in reversed(psi):
+            s_index = back[s_index]
+            rev_output.append(self._single_state_name(s_index))
 
-    def _viterbi_backward(self, delta, psi, sequence):
-        """ Decode by following the backpointers of psi """
-        rev_output = []
-        j_max = len(sequence)
-        max_final = 0
-        i_final = 0
-
-        # find highest probability start state
-        for i in range(len(self._all_states)):
-            current_final = delta[i][j_max - 1]
-            if current_final > max_final:
-                max_final = current_final
-                i_final = i
-
-        rev_output.append(self._get_state_by_order(self._all_states[i_final], 1))
-        i_cur = psi[i_final][j_max - 1][0]
-        j_cur = psi[i_final][j_max - 1][1]
-
-        for j in range(j_max - 2, -1, -1):
-            rev_output.append(self._get_state_by_order(self._all_states[i_cur], 1))
-            i_cur_old = i_cur
-            i_cur = psi[i_cur][j_cur][0]
-            j_cur = psi[i_cur_old][j_cur][1]
-
-        return rev_output[::-1]
-
-    def _train(self, sequence, k_smoothing=0.0):
-        """
-        Use the Baum-Welch Algorithm which utilizes Expectation-Maximization
-        and the Forward-Backward algorithm to find the maximum likelihood
-        estimate for parameters (A,B,pi).
+        return rev_output[::-1], exact
+
+    def _prune(self, delta, beam, threshold):
+        """
+        Keeps the states of delta within the beam.
+        Args:
+            delta (dict<int:float>): log probability of each reached state
+            beam (int): maximum number of states to keep, or None
+            threshold (float): minimum probability relative to the best
+                state, or None
+        Returns:
+            tuple(dict<int:float>, boolean): kept states and whether any
+                state was discarded.
+        """
+        num_reached = len(delta)
+        if(threshold is not None and num_reached > 0):
+            cutoff = max(delta.values()) + log(threshold)
+            delta = dict(
+                (s_index, log_prob) for s_index, log_prob in delta.items()
+                if log_prob >= cutoff
+            )
+        if(beam is not None and len(delta) > beam):
+            delta = dict(nlargest(beam, delta.items(), key=lambda item: item[1]))
+
+        return delta, len(delta) < num_reached
+
+    def _single_state_name(self, s_index):
+        """ order 1 state of the state at index s_index of self._all_states """
+        return self._single_states[self._state_to_single[s_index]]
+
+    def _e_step(self, sequences, pool, n_jobs, method="baum-welch", low_memory=False):
+        """
+        Expected counts of all sequences. With a process pool, sequences
+        are dealt out to n_jobs workers and their partial statistics are
+        reduced in this process.
+        Args:
+            method (string): 'baum-welch' for expected counts, 'viterbi'
+                for the counts of the best path of each sequence.
+            low_memory (boolean): see _expected_counts.
+        Returns:
+            SufficientStatistics
+            list<list<int>>: with method 'viterbi', the best path of each
+                sequence dealt out the same way for a given n_jobs, so
+                paths of successive calls compare equal when unchanged.
+                None otherwise.
+        """
+        profiler = self._profiler
+        if(profiler is not None):
+            start = default_timer()
+
+        if(pool is None):
+            stats, paths = self._counts(sequences, method, low_memory)
+        else:
+            profile = profiler is not None
+            jobs = [
+                (self, sequences[i::n_jobs], method, low_memory, profile)
+                for i in range(n_jobs)
+            ]
+            results = pool.map(_counts_job, jobs)
+            stats, paths, _ = results[0]
+            for other, other_paths, _ in results[1:]:
+                stats.merge(other)
+                if(paths is not None):
+                    paths.extend(other_paths)
+            if(profile):
+                for _, _, worker_profiler in results:
+                    profiler.merge(worker_profiler)
+
+        if(profiler is not None):
+            profiler.lap("e_step", start)
+            profiler.count("sequences", len(sequences))
+            profiler.count("observations", sum(map(len, sequences)))
+        return stats, paths
+
+    def _counts(self, sequences, method, low_memory=False):
+        """ counts of sequences for the E-step of the given method """
+        if(method == "viterbi"):
+            return self._viterbi_counts(sequences, low_memory)
+        return self._expected_counts(sequences, low_memory), None
+
+    def _gamma(self, alpha, beta, columns):
+        """
+        Posterior of each state at each observation from the scaled alpha
+        and beta matrices. Columns of a sequence that cannot be emitted
+        are left 0.
+        Returns:
+            gamma (rows: states, columns: observations)
+        """
+        rows = len(self._all_states)
+        gamma = init_matrix(rows, columns, "float")
+        for o_index in range(columns):
+            column = self._gamma_column(
+                [row[o_index] for row in alpha],
+                [row[o_index] for row in beta]
+            )
+            for s_index in range(rows):
+                gamma[s_index][o_index] = column[s_index]
+        return gamma
+
+    def _gamma_column(self, alpha_column, beta_column):
+        """ gamma of each state at a single observation, see _gamma """
+        total = sum(map(lambda a, b: a * b, alpha_column, beta_column))
+        if(total == 0):
+            return [0.0] * len(alpha_column)
+        return [a * b / total for a, b in zip(alpha_column, beta_column)]
+
+    def _posteriors(self, sequence):
+        """ posteriors of the single states, see 'posteriors' """
+        if(self._engine is not None):
+            return self._engine.posteriors(sequence)
+        if(len(sequence) == 0):
+            return []
+
+        columns = len(sequence)
+        alpha, scales = self._forward(sequence)
+        beta = self._backward(sequence, scales)
+        gamma = self._gamma(alpha, beta, columns)
+
+        posteriors = init_matrix(columns, len(self._single_states), "float")
+        for s_index, gamma_row in enumerate(gamma):
+            s_single = self._state_to_single[s_index]
+            for o_index in range(columns):
+                posteriors[o_index][s_single] += gamma_row[o_index]
+        return posteriors
+
+    def _expected_counts(self, sequences, low_memory=False):
+        """
+        E-step of the Baum-Welch Algorithm which utilizes the
+        Forward-Backward algorithm to accumulate the expected counts of
+        starting states, transitions, and emissions given (A,B,pi).
         Notation used:
             gamma: Probability of being in state i at time t
                 given O and (A,B,pi).
                 Row: state. Column: observation
             xi: Joint probability of being in state i at time t and
-                state (i + 1) at time (t + 1) given O and (A,B,pi).
-                xi[state i][state j][time t]
+                state j at time (t + 1) given O and (A,B,pi). Only its
+                sum over time is kept, shaped like A, and it is added to
+                one time step at a time.
         Args:
-            sequence (list<char>): Observation sequence O
-            k_smoothing (float): Smoothing parameter for add-k smoothing to
-                avoid zero probability. Value should be between [0.0, 1.0].
+            sequences (list<O>): Observation sequences
+            low_memory (boolean): use the checkpointed forward-backward
+                algorithm, see _add_checkpointed_counts.
+        Returns:
+            SufficientStatistics
         """
+        profiler = self._profiler
+        if(self._engine is not None):
+            return self._engine.expected_counts(sequences, profiler, low_memory)
+
         rows = len(self._all_states)
-        columns = len(sequence)
+        stats = SufficientStatistics(
+            rows,
+            len(self._single_states),
+            len(self._all_obs),
+            sparse_rows=self._A if self._sparse else None
+        )
+        xi_t = self._init_like_A(float)
+        for sequence in sequences:
+            columns = len(sequence)
+            if(columns == 0):
+                stats.log_likelihood += NEG_INF
+                continue
+            obs_indices = self._encode(sequence)
+            if(low_memory):
+                self._add_checkpointed_counts(obs_indices, stats, xi_t)
+                continue
 
-        alpha = self._forward(sequence)
-        beta = self._backward(sequence)
+            if(profiler is not None):
+                start = default_timer()
+            alpha, scales = self._forward(sequence)
+            if(profiler is not None):
+                start = profiler.lap("forward", start)
+            beta = self._backward(sequence, scales)
+            if(profiler is not None):
+                start = profiler.lap("backward", start)
+            stats.log_likelihood += sum(map(safe_log, scales))
 
-        # build gamma
-        gamma = init_matrix(rows, columns, "float")
-        for s_index in range(rows):
-            for o_index in range(columns):
-                prob = alpha[s_index][o_index] * beta[s_index][o_index]
-                prob /= sum(map(
-                    lambda j: alpha[j][o_index] * beta[j][o_index],
-                    range(rows)
+            gamma = self._gamma(alpha, beta, columns)
+            if(profiler is not None):
+                start = profiler.lap("gamma", start)
+
+            xi_sum = self._init_like_A(float)
+            for o_index in range(columns - 1):
+                self._add_xi(
+                    [row[o_index] for row in alpha],
+                    [row[o_index + 1] for row in beta],
+                    obs_indices[o_index + 1],
+                    xi_t,
+                    xi_sum
+                )
+            if(profiler is not None):
+                start = profiler.lap("xi", start)
+
+            # accumulate expected counts
+            stats.num_sequences += 1
+            for s_index in range(rows):
+                stats.start[s_index] += gamma[s_index][0]
+                stats.trans_total[s_index] += sum(gamma[s_index][:columns - 1])
+                for s_prime, xi_value in self._successors(xi_sum, s_index):
+                    stats.trans[s_index][s_prime] += xi_value
+
+                single_state_index = self._state_to_single[s_index]
+                emit_row = stats.emit[single_state_index]
+                for o_index in range(columns):
+                    emit_row[obs_indices[o_index]] += gamma[s_index][o_index]
+                stats.emit_total[single_state_index] += sum(gamma[s_index])
+            if(profiler is not None):
+                profiler.lap("accumulate", start)
+
+        return stats
+
+    def _add_xi(self, alpha_column, next_beta, obs_index, xi_t, xi_sum):
+        """
+        Adds xi of a single time step t into xi_sum.
+        Args:
+            alpha_column (list<float>): scaled alpha of each state at t.
+            next_beta (list<float>): scaled beta of each state at t + 1.
+            obs_index (int): index of the observation at t + 1.
+            xi_t: matrix shaped like A, overwritten with unnormalized xi.
+            xi_sum: matrix shaped like A.
+        """
+        rows = len(self._all_states)
+        weighted_beta = [
+            next_beta[s_to] * self._B[self._state_to_single[s_to]][obs_index]
+            for s_to in range(rows)
+        ]
+
+        denominator = 0.0
+        for s_from in range(rows):
+            alpha_prob = alpha_column[s_from]
+            xi_row = xi_t[s_from]
+            for s_to, a_prob in self._successors(self._A, s_from):
+                prob = alpha_prob * weighted_beta[s_to] * a_prob
+                xi_row[s_to] = prob
+                denominator += prob
+
+        if denominator == 0:
+            return
+
+        for s_from in range(rows):
+            sum_row = xi_sum[s_from]
+            for s_to, prob in self._successors(xi_t, s_from):
+                sum_row[s_to] += prob / denominator
+
+    def _add_checkpointed_counts(self, obs_indices, stats, xi_t):
+        """
+        Checkpointed forward-backward algorithm: adds the expected counts
+        of a sequence of T observations into stats while keeping only
+        O(N * sqrt(T)) values of alpha and beta instead of O(N * T). The
+        forward pass keeps alpha at every ceil(sqrt(T))-th observation.
+        The backward pass then recomputes alpha of one such segment at a
+        time, latest first, and accumulates the counts of the segment, at
+        the cost of a second forward pass. Counts match those of the
+        full algorithm up to rounding.
+        Args:
+            obs_indices (list<int>): encoded non-empty sequence.
+            stats (SufficientStatistics): counts to add to.
+            xi_t: matrix shaped like A used by _add_xi.
+        """
+        profiler = self._profiler
+        if(profiler is not None):
+            start = default_timer()
+        rows = len(self._all_states)
+        columns = len(obs_indices)
+        interval = int(ceil(sqrt(columns)))
+
+        scales = [0.0] * columns
+        checkpoints = []
+        column = None
+        for t_index in range(columns):
+            column = self._scaled_alpha(column, t_index, obs_indices[t_index], scales)
+            if(t_index % interval == 0):
+                checkpoints.append(column)
+        stats.log_likelihood += sum(map(safe_log, scales))
+        if(profiler is not None):
+            start = profiler.lap("forward", start)
+
+        xi_sum = self._init_like_A(float)
+        next_beta = None
+        for first in reversed(range(0, columns, interval)):
+            alphas = [checkpoints[first // interval]]
+            for t_index in range(first + 1, min(first + interval, columns)):
+                alphas.append(self._scaled_alpha(
+                    alphas[-1], t_index, obs_indices[t_index], scales
                 ))
-                gamma[s_index][o_index] = prob
-
-        # buid xi
-        xi = init_3d_matrix(rows, rows, columns - 1)
-        for o_index in range(columns - 1):
-            obs = sequence[o_index]
-            obs_next = sequence[o_index + 1]
-
-            denominator = 0.0
-            for s_from in range(rows):
-                for s_to, state_to in enumerate(self._all_states):
-                    single_state_index = self._single_states.index(
-                        self._get_state_by_order(state_to, 1)
-                    )
-                    prob = (
-                        alpha[s_from][o_index]
-                        * beta[s_to][o_index + 1]
-                        * self._A[s_from][s_to]
-                        * self._B[single_state_index][self._all_obs.index(obs_next)]
-                    )
-                    xi[s_from][s_to][o_index] = prob
-                    denominator += prob
 
-            if denominator == 0:
+            for t_index in reversed(range(first, first + len(alphas))):
+                alpha_column = alphas[t_index - first]
+                if(next_beta is None):
+                    beta_column = [1] * rows
+                else:
+                    o_next = obs_indices[t_index + 1]
+                    beta_column = self._backward_step(next_beta, o_next, scales[t_index + 1])
+                    self._add_xi(alpha_column, next_beta, o_next, xi_t, xi_sum)
+
+                gamma_column = self._gamma_column(alpha_column, beta_column)
+                emit_column = obs_indices[t_index]
+                for s_index, gamma_value in enumerate(gamma_column):
+                    if(t_index == 0):
+                        stats.start[s_index] += gamma_value
+                    if(t_index < columns - 1):
+                        stats.trans_total[s_index] += gamma_value
+                    single_state_index = self._state_to_single[s_index]
+                    stats.emit[single_state_index][emit_column] += gamma_value
+                    stats.emit_total[single_state_index] += gamma_value
+                next_beta = beta_column
+
+        stats.num_sequences += 1
+        for s_index in range(rows):
+            for s_prime, xi_value in self._successors(xi_sum, s_index):
+                stats.trans[s_index][s_prime] += xi_value
+        if(profiler is not None):
+            profiler.lap("backward", start)
+
+    def _scaled_alpha(self, prev_alpha, t_index, obs_index, scales):
+        """
+        Scaled alpha of each state at t_index from that of t_index - 1,
+        recording the normalizer in scales like _forward.
+        """
+        if(t_index == 0):
+            column = self._forward_start(obs_index)
+        else:
+            column = self._forward_step(prev_alpha, t_index, obs_index)
+        total = sum(column)
+        scales[t_index] = total
+        if(total == 0):
+            return column
+        return [alpha / total for alpha in column]
+
+    def _viterbi_counts(self, sequences, low_memory=False):
+        """
+        E-step of Viterbi training: counts of starting states, transitions
+        and emissions along the best state path of each sequence given
+        (A,B,pi). Transitions are counted from the observation at which A
+        takes over from pi, like the builder counts labeled sequences.
+        Args:
+            sequences (list<O>): Observation sequences
+            low_memory (boolean): decode with _viterbi_low_memory.
+        Returns:
+            SufficientStatistics: log_likelihood sums log P(O,S|lambda)
+                over the best paths S.
+            list<list<int>>: best path of each sequence as state indices.
+        """
+        profiler = self._profiler
+        stats = SufficientStatistics(
+            len(self._all_states),
+            len(self._single_states),
+            len(self._all_obs),
+            sparse_rows=self._A if self._sparse else None
+        )
+        paths = []
+        for sequence in sequences:
+            columns = len(sequence)
+            if(columns == 0):
+                stats.log_likelihood += NEG_INF
+                paths.append([])
+                continue
+            obs_indices = self._encode(sequence)
+
+            if(profiler is not None):
+                start = default_timer()
+            path, log_prob = self._best_path(sequence, low_memory)
+            if(profiler is not None):
+                start = profiler.lap("viterbi", start)
+            paths.append(path)
+            stats.log_likelihood += log_prob
+            if(log_prob == NEG_INF):
                 continue
 
-            for s_from in range(rows):
-                for s_to in range(rows):
-                    xi[s_from][s_to][o_index] /= denominator
+            # the first state whose full history is drawn from pi
+            stats.num_sequences += 1
+            stats.start[path[min(self._highest_order, columns) - 1]] += 1
+            for t_index in range(self._highest_order, columns):
+                stats.trans[path[t_index - 1]][path[t_index]] += 1
+                stats.trans_total[path[t_index - 1]] += 1
+            for s_index, obs_index in zip(path, obs_indices):
+                single_state_index = self._state_to_single[s_index]
+                stats.emit[single_state_index][obs_index] += 1
+                stats.emit_total[single_state_index] += 1
+            if(profiler is not None):
+                profiler.lap("accumulate", start)
+
+        return stats, paths
+
+    def _save_checkpoint(self, path, iteration, score, paths, elapsed):
+        """
+        Saves the parameters and the state of learn right after an M-step.
+        Args:
+            iteration (int): re-estimations made so far.
+            score (float): average score of the parameters before the
+                latest re-estimation.
+            paths (list<list<int>>): paths of method 'viterbi', or None.
+            elapsed (float): seconds spent learning so far.
+        """
+        if(self._profiler is not None):
+            start = default_timer()
+        write_checkpoint(self, path, {
+            "iteration": iteration,
+            "score": score,
+            "paths": paths,
+            "elapsed": elapsed,
+            "random_state": random.getstate()
+        })
+        if(self._profiler is not None):
+            self._profiler.lap("checkpoint", start)
+
+    def _resume(self, path):
+        """
+        Restores the parameters and the state of random saved in the
+        checkpoint at path.
+        Returns:
+            tuple(int, float, list<list<int>>, float): iteration, score,
+                paths and elapsed seconds, see _save_checkpoint.
+        """
+        stored = read_model(path, mmap=False)
+        learn_state = stored["learn_state"]
+        if(learn_state is None):
+            raise ValueError(repr(path) + " is not a checkpoint of learn")
+        if(stored["all_states"] != list(self._all_states)
+                or stored["all_obs"] != list(self._all_obs)
+                or stored["single_states"] != list(self._single_states)
+                or stored["order"] != self._highest_order
+                or stored["sparse"] != self._sparse):
+            raise ValueError(repr(path) + " is a checkpoint of another model")
+
+        if(self._sparse):
+            self._A = stored["A"]
+        else:
+            self._A = [list(row) for row in stored["A"]]
+        self._B = [list(row) for row in stored["B"]]
+        self._pi = stored["pi"]
+        self._read_only = False
+        self._compile()
+
+        version, internal_state, gauss_next = learn_state["random_state"]
+        random.setstate((version, tuple(internal_state), gauss_next))
+        return (
+            learn_state["iteration"],
+            learn_state["score"],
+            learn_state["paths"],
+            learn_state["elapsed"]
+        )
+
+    def _m_step(self, stats, k_smoothing=0.0):
+        """
+        M-step of the Baum-Welch Algorithm: maximum likelihood estimate
+        of (A,B,pi) from expected counts.
+        Args:
+            stats (SufficientStatistics): expected counts of the E-step.
+            k_smoothing (float): Smoothing parameter for add-k smoothing to
+                avoid zero probability. Value should be between [0.0, 1.0].
+        """
+        if(self._profiler is not None):
+            start = default_timer()
+        if(self._read_only):
+            self._copy_parameters()
+        rows = len(self._all_states)
+        num_obs = len(self._all_obs)
 
-        # update all parameters (A,B,pi).
         for s_index, state in enumerate(self._all_states):
             # update pi
             self._pi[self._highest_order - 1][state] = (
-                (gamma[s_index][0] + k_smoothing)
-                / (1 + rows * k_smoothing)
+                (stats.start[s_index] + k_smoothing)
+                / (stats.num_sequences + rows * k_smoothing)
             )
 
-            # update A
-            gamma_sum = sum(map(
-                lambda o_index: gamma[s_index][o_index],
-                range(columns - 1)
-            ))
-            if(gamma_sum == 0):
-                for s_prime in range(rows):
+            # update A, smoothing over the successors of the state
+            gamma_sum = stats.trans_total[s_index]
+            num_successors = len(self._A[s_index])
+            for s_prime, xi_sum in self._successors(stats.trans, s_index):
+                if(gamma_sum == 0):
                     self._A[s_index][s_prime] = 0
-            else:
-                for s_prime in range(rows):
-                    xi_sum = sum(map(
-                        lambda o_index: xi[s_index][s_prime][o_index],
-                        range(columns - 1)
-                    ))
+                else:
                     self._A[s_index][s_prime] = (
                         (xi_sum + k_smoothing)
-                        / (gamma_sum + (rows * k_smoothing))
+                        / (gamma_sum + (num_successors * k_smoothing))
                     )
 
-            # update B
-            gamma_sum += gamma[s_index][columns - 1]
-            single_state_index = self._single_states.index(
-                self._get_state_by_order(state, 1)
-            )
-            if(gamma_sum == 0):
-                for o_index in range(columns):
+        # update B
+        for single_state_index, gamma_sum in enumerate(stats.emit_total):
+            for o_index in range(num_obs):
+                if(gamma_sum == 0):
                     self._B[single_state_index][o_index] = 0
-            else:
-                gamma_b_sum = list(map(
-                    lambda x: 0,
-                    range(len(self._all_obs))
-                ))
-
-                for o_index in range(columns):
-                    full_obs_index = self._all_obs.index(sequence[o_index])
-                    gamma_b_sum[full_obs_index] += gamma[s_index][o_index]
-
-                for o_index in range(len(self._all_obs)):
+                else:
                     self._B[single_state_index][o_index] = (
-                        (gamma_b_sum[o_index] + k_smoothing)
-                        / (gamma_sum + (columns * k_smoothing))
+                        (stats.emit[single_state_index][o_index] + k_smoothing)
+                        / (gamma_sum + (num_obs * k_smoothing))
                     )
 
-    def _get_state_by_order(self, state, order):
-        """
-        Gets single state for any order HMM.
-        Examples (let order == 1):
-            'a1-b0-a0' => 'a0'
-            'a1-b0' => 'b0'
-            'a1' => 'a1'
-        Args:
-            state: '-' delimited composite state
-            order: desired order state to return
-        Returns:
-            string: modified state
-        """
-        if(self._highest_order == 1):
-            return state
-        split_state = state.split('-')
-        l = len(split_state)
-        if(order > l):
-            raise ValueError("Specified order is higher than given state.")
+        self._compile()
+        if(self._profiler is not None):
+            self._profiler.lap("m_step", start)
+
+    def _copy_parameters(self):
+        """ Replaces read-only views of A and B with lists that learn can update """
+        if(not self._sparse):
+            self._A = [list(row) for row in self._A]
+        self._B = [list(row) for row in self._B]
+        self._read_only = False
+
+def _argmax(values):
+    """ index of the first largest of values, 0 if all are -inf """
+    best = 0
+    for i in range(1, len(values)):
+        if(values[i] > values[best]):
+            best = i
+    return best
+
+def _merge_k_best(heads, delta, keys, k):
+    """
+    The k best extensions into a state. The paths of each previous state
+    are sorted, so they are merged lazily from the best extension of each
+    previous state in O(W + k log W) for W previous states.
+    Args:
+        heads (list<tuple>): (-score, prev state, 0, weight) of extending
+            the best path of each previous state by weight.
+        delta: scores of the kept paths of each state, best first.
+        keys: keys of the kept paths, see _viterbi_nbest_forward. Only the
+            best extension of paths of equal keys is kept if given.
+        k (int): number of extensions to return.
+    Returns:
+        list<tuple(float, int, int)>: score, previous state and rank of
+            the extended path, best first.
+    """
+    heapify(heads)
+    seen = set()
+    best = []
+    while(len(heads) > 0 and len(best) < k):
+        score, s_prev, rank, weight = heads[0]
+        if(keys is None or keys[s_prev][rank] not in seen):
+            best.append((-score, s_prev, rank))
+            if(keys is not None):
+                seen.add(keys[s_prev][rank])
+        if(rank + 1 < len(delta[s_prev])):
+            heapreplace(heads, (-(delta[s_prev][rank + 1] + weight), s_prev, rank + 1, weight))
+        else:
+            heappop(heads)
+    return best
 
-        return '-'.join(split_state[l - order:l])
+def _distinct(candidates, keys, k):
+    """
+    The first k of candidates (score, state, rank) whose paths keys[state][rank]
+    differ.
+    """
+    seen = set()
+    distinct = []
+    for candidate in candidates:
+        key = keys[candidate[1]][candidate[2]]
+        if key not in seen:
+            seen.add(key)
+            distinct.append(candidate)
+            if(len(distinct) == k):
+                break
+    return distinct
+
+def _counts_job(job):
+    """
+    E-step of a chunk of sequences, run by a worker process. The profiler
+    of the worker, if profiling, is returned to be merged by the caller.
+    """
+    hmm, sequences, method, low_memory, profile = job
+    hmm._profiler = Profiler() if profile else None
+    stats, paths = hmm._counts(sequences, method, low_memory)
+    return stats, paths, hmm._profiler
@@ -0,0 +1,197 @@
+from __future__ import print_function
+
+from collections import Counter, deque
+from functools import wraps
+from timeit import default_timer
+
+# per timer, percentiles are taken over this many of the latest durations
+DEFAULT_MAX_SAMPLES = 10000
+
+class Profiler:
+    """
+    Collects timings and counters of a HiddenMarkovModel it is attached to
+    with hmm.set_profiler(profiler). Without a profiler attached, the model
+    only checks for one before each phase.
+    Timers recorded:
+        evaluate, evaluate_log, decode, decode_nbest, decode_posterior,
+            posteriors, evaluate_many, evaluate_log_many, decode_many,
+            posteriors_many, learn, learn_online: latency of each call of
+            the method.
+        e_step, m_step: each step of learn and learn_online. With
+            n_jobs > 1 the e_step is wall time of the whole pool.
+        forward, backward, gamma, xi, accumulate: phases of the E-step of
+            each sequence. With n_jobs > 1 these are summed over workers.
+            With low_memory, backward includes recomputing alpha.
+        viterbi: decoding each sequence in the E-step of
+            learn(method='viterbi'), followed by accumulate.
+        checkpoint: saving each checkpoint of learn.
+    Counters recorded:
+        iterations: re-estimations of (A,B,pi) made by learn and
+            learn_online.
+        sequences, observations: processed by the E-step.
+    """
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        """
+        Args:
+            max_samples (int): number of latest durations of each timer
+                kept for percentiles.
+        """
+        self.max_samples = max_samples
+        self.timers = dict()
+        self.counters = Counter()
+
+    def add_time(self, name, seconds):
+        """ Records a duration of the timer called name """
+        if name not in self.timers:
+            self.timers[name] = TimerStats(self.max_samples)
+        self.timers[name].add(seconds)
+
+    def lap(self, name, start):
+        """
+        Records the time since start for the timer called name.
+        Args:
+            name (string): timer to record.
+            start (float): default_timer() at the start of the phase.
+        Returns:
+            float: default_timer() now, the start of the next phase.
+        """
+        now = default_timer()
+        self.add_time(name, now - start)
+        return now
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def merge(self, other):
+        """
+        Adds the timers and counters of other into this profiler.
+        Returns:
+            Profiler: self
+        """
+        for name, stats in other.timers.items():
+            if name not in self.timers:
+                self.timers[name] = TimerStats(self.max_samples)
+            self.timers[name].merge(stats)
+        self.counters.update(other.counters)
+        return self
+
+    def reset(self):
+        self.timers = dict()
+        self.counters = Counter()
+
+    def summary(self):
+        """
+        Returns:
+            dict: 'timers' mapping each timer to its TimerStats.summary()
+                and 'counters' mapping each counter to its value.
+        """
+        return {
+            "timers": dict(
+                (name, stats.summary()) for name, stats in self.timers.items()
+            ),
+            "counters": dict(self.counters)
+        }
+
+    def display(self):
+        """ Display the timers and counters on the console. """
+        print("{:<18} {:>8} {:>12} {:>12} {:>12} {:>12}".format(
+            "timer", "calls", "total (s)", "mean (ms)", "p50 (ms)", "p99 (ms)"
+        ))
+        for name in sorted(self.timers):
+            stats = self.timers[name].summary()
+            print("{:<18} {:>8} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f}".format(
+                name,
+                stats["count"],
+                stats["total"],
+                stats["mean"] * 1000,
+                stats["p50"] * 1000,
+                stats["p99"] * 1000
+            ))
+        for name in sorted(self.counters):
+            print("{:<18} {:>8}".format(name, self.counters[name]))
+
+class TimerStats:
+    """
+    Running statistics of the durations recorded by one timer. Count,
+    total, min and max cover every duration; percentiles cover the latest
+    max_samples durations.
+    """
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        """
+        Args:
+            max_samples (int): number of latest durations kept.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if(seconds < self.min):
+            self.min = seconds
+        if(seconds > self.max):
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.samples.extend(other.samples)
+
+    def percentile(self, p):
+        """
+        Nearest-rank percentile of the kept durations.
+        Args:
+            p (float): percentile between [0, 100].
+        Returns:
+            float: seconds. 0.0 if nothing was recorded.
+        """
+        if(len(self.samples) == 0):
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = int(round(p / 100.0 * (len(ordered) - 1)))
+        return ordered[rank]
+
+    def summary(self):
+        """
+        Returns:
+            dict: count, total, mean, min, max, p50, p90, p99 in seconds.
+        """
+        if(self.count == 0):
+            return dict.fromkeys(
+                ["count", "total", "mean", "min", "max", "p50", "p90", "p99"], 0
+            )
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99)
+        }
+
+def timed(name):
+    """
+    Decorates a method of HiddenMarkovModel such that the latency of each
+    call is recorded under name when a profiler is attached.
+    """
+    def decorate(method):
+        @wraps(method)
+        def timed_method(self, *args, **kwargs):
+            profiler = self._profiler
+            if(profiler is None):
+                return method(self, *args, **kwargs)
+            start = default_timer()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profiler.lap(name, start)
+        return timed_method
+    return decorate
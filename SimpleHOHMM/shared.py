@@ -0,0 +1,114 @@
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from .model import HiddenMarkovModel
+from .storage import decode_model, model_chunks
+
+class SharedModel:
+    """
+    Parameters of a HiddenMarkovModel published in a block of shared
+    memory, using the layout of HiddenMarkovModel.save. Worker processes
+    attach to the block by name and view the parameters read-only, so A
+    and B exist once no matter how many workers decode with them.
+    Pickling a SharedModel only sends its name; unpickling attaches.
+    Lifecycle:
+        publisher:  shared = SharedModel.create(hmm)
+        worker:     shared = SharedModel.attach(name)
+                    hmm = shared.model()
+                    ...
+                    del hmm
+                    shared.close()
+        publisher:  shared.close()
+                    shared.unlink()
+    A SharedModel used as a context manager is closed on exit, and also
+    unlinked if it created the block.
+    """
+    def __init__(self, shm, created):
+        self._shm = shm
+        self._created = created
+
+    @staticmethod
+    def create(hmm, name=None):
+        """
+        Copies the parameters of hmm into a new block of shared memory.
+        Args:
+            hmm (HiddenMarkovModel): model to publish.
+            name (string): name of the block. Defaults to a unique name.
+        Returns:
+            SharedModel
+        """
+        _check_shared_memory()
+        chunks = model_chunks(hmm)
+        shm = shared_memory.SharedMemory(
+            name=name,
+            create=True,
+            size=sum(len(chunk) for chunk in chunks)
+        )
+        position = 0
+        for chunk in chunks:
+            shm.buf[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        return SharedModel(shm, created=True)
+
+    @staticmethod
+    def attach(name):
+        """
+        Attaches to a block created by SharedModel.create.
+        Args:
+            name (string): name of the block, see SharedModel.name.
+        Returns:
+            SharedModel
+        """
+        _check_shared_memory()
+        return SharedModel(shared_memory.SharedMemory(name=name), created=False)
+
+    @property
+    def name(self):
+        """ Name other processes attach to """
+        return self._shm.name
+
+    def model(self, engine=None):
+        """
+        Args:
+            engine (string): compute engine of the model, either 'python'
+                or 'numpy'. Defaults to the engine of the published model.
+        Returns:
+            HiddenMarkovModel: viewing the shared parameters without
+                copying them. Learning copies them into the model first.
+        """
+        stored = decode_model(self._shm.buf.toreadonly())
+        return HiddenMarkovModel._from_stored(stored, engine)
+
+    def close(self):
+        """
+        Detaches this process from the block. Models returned by 'model'
+        must be discarded first.
+        """
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Destroys the block once every process has closed it. Called once,
+        usually by the publisher.
+        """
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # unlink even if close fails because a model still views the block
+        try:
+            self.close()
+        finally:
+            if(self._created):
+                self.unlink()
+
+    def __reduce__(self):
+        return (SharedModel.attach, (self.name,))
+
+def _check_shared_memory():
+    if(shared_memory is None):
+        raise ImportError("SharedModel requires multiprocessing.shared_memory (Python 3.8+).")
@@ -0,0 +1,137 @@
+from itertools import product
+
+# joins the single states of a composite state name, e.g. 'a-b'
+SEPARATOR = '-'
+
+class CompositeStates:
+    """
+    Mixed-radix integer encoding of the composite states of a higher order
+    HMM. A state of order k is a history (s1,...,sk) of single states,
+    oldest first, encoded with radix S = number of single states as:
+        code = index(s1) * S^(k-1) + ... + index(sk) * S^0
+    Codes of order k states therefore enumerate the states in the order of
+    itertools.product(single_states, repeat=k), and:
+        the order j history of a state is code % S^j
+        the order 1 state of a state is code % S
+        the successors of a state are the S consecutive codes starting at
+            (code % S^(k-1)) * S
+    Names such as 'a-b' are only built or parsed at the API boundary.
+    """
+    def __init__(self, single_states):
+        """
+        Args:
+            single_states (list<string>): single states in order of their
+                digit value.
+        """
+        self.single_states = list(single_states)
+        self.radix = len(self.single_states)
+        self._digits = dict(
+            (state, digit) for digit, state in enumerate(self.single_states)
+        )
+
+    def index(self, single_state):
+        """ digit of a single state, raising ValueError like list.index """
+        if single_state not in self._digits:
+            raise ValueError(repr(single_state) + " is not in list")
+        return self._digits[single_state]
+
+    def encode(self, history):
+        """
+        Args:
+            history (list<string>): single states, oldest first.
+        Returns:
+            int: code of the composite state of order len(history).
+        """
+        code = 0
+        for single_state in history:
+            code = code * self.radix + self.index(single_state)
+        return code
+
+    def decode(self, code, order):
+        """
+        Returns:
+            list<string>: single states of the order 'order' state code,
+                oldest first.
+        """
+        history = []
+        for i in range(order):
+            code, digit = divmod(code, self.radix)
+            history.append(self.single_states[digit])
+        history.reverse()
+        return history
+
+    def project(self, code, order):
+        """ code of the order 'order' history of the state code """
+        return code % self.radix ** order
+
+    def successors(self, code, order):
+        """ codes of the order 'order' states that may follow code """
+        first = code % self.radix ** (order - 1) * self.radix
+        return range(first, first + self.radix)
+
+    def name(self, code, order):
+        """ name of the order 'order' state code, e.g. 'a-b' """
+        return SEPARATOR.join(self.decode(code, order))
+
+    def names(self, order):
+        """
+        Returns:
+            list<string>: names of all states of the given order, indexed
+                by code.
+        """
+        if(order == 1):
+            return list(self.single_states)
+        return [
+            SEPARATOR.join(history)
+            for history in product(self.single_states, repeat=order)
+        ]
+
+    def parse(self, name, order):
+        """
+        Code of a composite state name. Single state labels may themselves
+        contain SEPARATOR; a name matching several histories resolves to
+        the one whose oldest labels are shortest.
+        Args:
+            name (string): name of a state of the given order.
+            order (int): number of single states in the name.
+        Returns:
+            int: code of the state.
+        """
+        if(order == 1):
+            return self.index(name)
+
+        pieces = name.split(SEPARATOR)
+        if(len(pieces) == order):
+            digits = self._digits
+            code = 0
+            for piece in pieces:
+                digit = digits.get(piece)
+                if(digit is None):
+                    break
+                code = code * self.radix + digit
+            else:
+                return code
+
+        history = self._match(pieces, order)
+        if(history is None):
+            raise ValueError(
+                repr(name) + " is not a state of order " + str(order)
+            )
+        return self.encode(history)
+
+    def _match(self, pieces, order):
+        """
+        Groups consecutive pieces into order single state labels.
+        Returns:
+            list<string>: the labels, None if there is no such grouping.
+        """
+        if(order == 0):
+            return [] if len(pieces) == 0 else None
+
+        for end in range(1, len(pieces) - order + 2):
+            label = SEPARATOR.join(pieces[:end])
+            if label in self._digits:
+                rest = self._match(pieces[end:], order - 1)
+                if(rest is not None):
+                    return [label] + rest
+        return None
@@ -0,0 +1,88 @@
+from .utility import init_matrix
+
+class SufficientStatistics:
+    """
+    Expected counts gathered by the E-step of the Baum-Welch Algorithm over
+    a set of observation sequences. Statistics of disjoint sets of
+    sequences combine with merge, after which a single M-step re-estimates
+    the parameters (A,B,pi).
+    Notation used:
+        start: expected count of starting in each state.
+        trans: expected count of each state transition.
+            trans[state i][state j], dense or sparse like A.
+        trans_total: expected count of leaving each state.
+        emit: expected count of each single state emitting each observation.
+            emit[single state][observation]
+        emit_total: expected count of each single state emitting anything.
+        log_likelihood: sum of log P(O|lambda) over the sequences, a
+            by-product of the forward pass.
+    """
+    def __init__(self, num_states, num_single_states, num_obs, sparse_rows=None):
+        self.num_sequences = 0
+        self.log_likelihood = 0.0
+        self.start = [0.0] * num_states
+        if(sparse_rows is None):
+            self.trans = init_matrix(num_states, num_states, "float")
+        else:
+            self.trans = [dict.fromkeys(row, 0.0) for row in sparse_rows]
+        self.trans_total = [0.0] * num_states
+        self.emit = init_matrix(num_single_states, num_obs, "float")
+        self.emit_total = [0.0] * num_single_states
+
+    def merge(self, other):
+        """
+        Adds the expected counts of other into these statistics.
+        Args:
+            other (SufficientStatistics): statistics of the same shape.
+        Returns:
+            SufficientStatistics: self
+        """
+        self.num_sequences += other.num_sequences
+        self.log_likelihood += other.log_likelihood
+        _add_into(self.start, other.start)
+        _add_into(self.trans_total, other.trans_total)
+        _add_into(self.emit_total, other.emit_total)
+        for row, other_row in zip(self.trans, other.trans):
+            _add_into(row, other_row)
+        for row, other_row in zip(self.emit, other.emit):
+            _add_into(row, other_row)
+        return self
+
+    def blend(self, other, weight):
+        """
+        Moves these statistics towards other, the stepwise update of online
+        EM: self = (1 - weight) * self + weight * other. log_likelihood is
+        left as is.
+        Args:
+            other (SufficientStatistics): statistics of the same shape.
+            weight (float): step size between [0.0, 1.0].
+        Returns:
+            SufficientStatistics: self
+        """
+        self.num_sequences += weight * (other.num_sequences - self.num_sequences)
+        _blend_into(self.start, other.start, weight)
+        _blend_into(self.trans_total, other.trans_total, weight)
+        _blend_into(self.emit_total, other.emit_total, weight)
+        for row, other_row in zip(self.trans, other.trans):
+            _blend_into(row, other_row, weight)
+        for row, other_row in zip(self.emit, other.emit):
+            _blend_into(row, other_row, weight)
+        return self
+
+def _add_into(values, other_values):
+    if(isinstance(other_values, dict)):
+        other_values = other_values.items()
+    else:
+        other_values = enumerate(other_values)
+
+    for i, value in other_values:
+        values[i] += value
+
+def _blend_into(values, other_values, weight):
+    if(isinstance(other_values, dict)):
+        other_values = other_values.items()
+    else:
+        other_values = enumerate(other_values)
+
+    for i, value in other_values:
+        values[i] += weight * (value - values[i])
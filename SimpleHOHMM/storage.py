@@ -0,0 +1,283 @@
+from array import array
+from itertools import chain
+import json
+import mmap as mmap_module
+import os
+import struct
+import sys
+
+from .engine import np
+
+MAGIC = b"SHOHMM\x00\x01"
+FORMAT_VERSION = 1
+
+# arrays start on multiples of ALIGNMENT bytes from the start of the data
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sQ")
+
+# Python 2 cannot cast a memoryview to float64 values, so arrays are
+# copied out of the file there instead of viewed.
+_CAST = hasattr(memoryview, "cast")
+
+# Python 2 has no os.replace; os.rename replaces files on POSIX.
+_replace = getattr(os, "replace", os.rename)
+
+class MatrixView:
+    """
+    Read-only dense matrix over a flat buffer of float64 values, such as a
+    memory-mapped file. Indexing a row returns a memoryview of the row
+    without copying it. NumPy converts a MatrixView to an ndarray viewing
+    the same buffer. Pickling copies the values, such that a model viewing
+    a file can still be sent to worker processes.
+    """
+    def __init__(self, values, rows, columns):
+        """
+        Args:
+            values (memoryview): rows * columns float64 values, row major.
+            rows (int): number of rows.
+            columns (int): number of columns.
+        """
+        self._values = values
+        self._rows = rows
+        self._columns = columns
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row):
+        if(row < 0):
+            row += self._rows
+        if(not 0 <= row < self._rows):
+            raise IndexError("row index out of range")
+        start = row * self._columns
+        return self._values[start:start + self._columns]
+
+    def __iter__(self):
+        for row in range(self._rows):
+            yield self[row]
+
+    def __reduce__(self):
+        return (_matrix_view, (array("d", self._values), self._rows, self._columns))
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = np.frombuffer(self._values, dtype=np.float64)
+        matrix = matrix.reshape(self._rows, self._columns)
+        if(dtype is not None):
+            matrix = matrix.astype(dtype, copy=False)
+        return matrix
+
+def write_model(hmm, path):
+    """
+    Writes the parameters of hmm to path. Layout:
+        preamble: MAGIC, header size (little endian uint64)
+        header: JSON describing the model and the offset of each array
+        data: float64 and int64 arrays in native byte order, each aligned
+            to ALIGNMENT bytes from the start of the data.
+    Args:
+        hmm (HiddenMarkovModel): model to write.
+        path (string): file to write.
+    """
+    with open(path, "wb") as f:
+        for chunk in model_chunks(hmm):
+            f.write(chunk)
+
+def write_checkpoint(hmm, path, learn_state):
+    """
+    Writes hmm like write_model with the progress of learn added to the
+    header, so the file is also a model that 'read_model' can read. The
+    file is written beside path and then renamed over it, such that an
+    interrupted write leaves the previous checkpoint intact.
+    Args:
+        hmm (HiddenMarkovModel): model being learned.
+        path (string): file to write.
+        learn_state (dict): JSON serializable state of learn.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        for chunk in model_chunks(hmm, learn_state):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace(temp_path, path)
+
+def model_chunks(hmm, learn_state=None):
+    """
+    Args:
+        learn_state (dict): added to the header if given, see
+            write_checkpoint.
+    Returns:
+        list<bytes>: consecutive pieces of the layout of write_model.
+    """
+    header, arrays = encode_model(hmm)
+    if(learn_state is not None):
+        header["learn_state"] = learn_state
+    chunks = [pack_header(header)]
+    for values in arrays:
+        chunks.append(_array_bytes(values))
+        chunks.append(b"\x00" * _padding(len(values) * values.itemsize))
+    return chunks
+
+def read_model(path, mmap=True):
+    """
+    Reads the parameters written by write_model.
+    Args:
+        path (string): file to read.
+        mmap (boolean): view the arrays in a read-only memory map of the
+            file instead of reading it. Ignored on Python 2, where the
+            file is read and the arrays are copied.
+    Returns:
+        dict: parameters, see decode_model.
+    """
+    with open(path, "rb") as f:
+        if(mmap and _CAST):
+            buffer = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+        else:
+            buffer = f.read()
+    return decode_model(memoryview(buffer))
+
+def encode_model(hmm):
+    """
+    Returns:
+        dict: JSON serializable header, see write_model.
+        list<array>: arrays in the order of header["arrays"].
+    """
+    arrays = []
+    entries = []
+    offset = 0
+    def add(name, typecode, values):
+        values = array(typecode, values)
+        entries.append([name, typecode, offset, len(values)])
+        arrays.append(values)
+        return offset + len(values) * values.itemsize + _padding(len(values) * values.itemsize)
+
+    if(hmm._sparse):
+        indptr = [0]
+        for row in hmm._A:
+            indptr.append(indptr[-1] + len(row))
+        offset = add("A_indptr", "q", indptr)
+        offset = add("A_indices", "q", chain.from_iterable(hmm._A))
+        offset = add("A", "d", chain.from_iterable(row.values() for row in hmm._A))
+        offset = add("log_A", "d", chain.from_iterable(row.values() for row in hmm._log_A))
+    else:
+        offset = add("A", "d", chain.from_iterable(hmm._A))
+        offset = add("log_A", "d", chain.from_iterable(hmm._log_A))
+    offset = add("B", "d", chain.from_iterable(hmm._B))
+    offset = add("log_B", "d", chain.from_iterable(hmm._log_B))
+    for t_index, pi_dict in enumerate(hmm._pi):
+        offset = add("pi_" + str(t_index), "d", pi_dict.values())
+
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "order": hmm._highest_order,
+        "engine": hmm._engine_name,
+        "sparse": hmm._sparse,
+        "B_rows": len(hmm._B),
+        "all_obs": list(hmm._all_obs),
+        "all_states": list(hmm._all_states),
+        "single_states": list(hmm._single_states),
+        "pi_states": [list(pi_dict.keys()) for pi_dict in hmm._pi],
+        "arrays": entries
+    }
+    return header, arrays
+
+def pack_header(header):
+    """ Preamble and header padded such that the data is aligned """
+    header_bytes = json.dumps(header).encode("utf-8")
+    size = _PREAMBLE.size + len(header_bytes)
+    return _PREAMBLE.pack(MAGIC, len(header_bytes)) + header_bytes + b"\x00" * _padding(size)
+
+def decode_model(buffer):
+    """
+    Decodes the parameters of a model from a buffer holding the layout of
+    write_model. Dense matrices are MatrixViews of the buffer and are
+    not copied unless the byte order of the buffer differs. On Python 2
+    they are copied into lists.
+    Args:
+        buffer (memoryview): bytes of the layout.
+    Returns:
+        dict: A, B, pi, log_A, log_B, all_obs, all_states,
+            single_states, order, engine, sparse, learn_state (None unless
+            written by write_checkpoint)
+    """
+    magic, header_size = _PREAMBLE.unpack_from(buffer, 0)
+    if(magic != MAGIC):
+        raise ValueError("not a SimpleHOHMM model file")
+    header_end = _PREAMBLE.size + header_size
+    header = json.loads(buffer[_PREAMBLE.size:header_end].tobytes().decode("utf-8"))
+    if(header["version"] != FORMAT_VERSION):
+        raise ValueError("unsupported model format version: " + str(header["version"]))
+
+    data_start = header_end + _padding(header_end)
+    swap = header["byteorder"] != sys.byteorder
+    arrays = dict()
+    for name, typecode, offset, count in header["arrays"]:
+        start = data_start + offset
+        values = buffer[start:start + count * 8]
+        if(swap or not _CAST):
+            values = array(typecode, values.tobytes())
+            if(swap):
+                values.byteswap()
+            if(_CAST):
+                values = memoryview(values)
+        else:
+            values = values.cast(typecode)
+        arrays[name] = values
+
+    num_states = len(header["all_states"])
+    num_obs = len(header["all_obs"])
+    if(header["sparse"]):
+        indptr = arrays["A_indptr"]
+        indices = arrays["A_indices"]
+        A = []
+        log_A = []
+        for row in range(num_states):
+            successors = indices[indptr[row]:indptr[row + 1]]
+            A.append(dict(zip(successors, arrays["A"][indptr[row]:indptr[row + 1]])))
+            log_A.append(dict(zip(successors, arrays["log_A"][indptr[row]:indptr[row + 1]])))
+    else:
+        A = _matrix(arrays["A"], num_states, num_states)
+        log_A = _matrix(arrays["log_A"], num_states, num_states)
+
+    pi = [
+        dict(zip(states, arrays["pi_" + str(t_index)]))
+        for t_index, states in enumerate(header["pi_states"])
+    ]
+    return {
+        "A": A,
+        "B": _matrix(arrays["B"], header["B_rows"], num_obs),
+        "pi": pi,
+        "log_A": log_A,
+        "log_B": _matrix(arrays["log_B"], header["B_rows"], num_obs),
+        "all_obs": header["all_obs"],
+        "all_states": header["all_states"],
+        "single_states": header["single_states"],
+        "order": header["order"],
+        "engine": header["engine"],
+        "sparse": header["sparse"],
+        "learn_state": header.get("learn_state")
+    }
+
+def _matrix(values, rows, columns):
+    """ MatrixView of values, or a list of rows where values is an array """
+    if(_CAST):
+        return MatrixView(values, rows, columns)
+    return [
+        values[row * columns:(row + 1) * columns].tolist()
+        for row in range(rows)
+    ]
+
+def _array_bytes(values):
+    """ bytes of an array, array.tostring on Python 2 """
+    if(hasattr(values, "tobytes")):
+        return values.tobytes()
+    return values.tostring()
+
+def _matrix_view(values, rows, columns):
+    """ MatrixView over an array, see MatrixView.__reduce__ """
+    return MatrixView(memoryview(values), rows, columns)
+
+def _padding(size):
+    """ bytes needed after size bytes to reach a multiple of ALIGNMENT """
+    return -size % ALIGNMENT
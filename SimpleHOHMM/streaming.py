@@ -0,0 +1,237 @@
+from collections import deque
+
+from .utility import safe_log, NEG_INF
+
+DEFAULT_LAG = 100
+
+class StreamingDecoder:
+    """
+    Decodes an unbounded observation stream with the Viterbi Algorithm
+    using a HiddenMarkovModel. Observations are pushed one at a time and a
+    hidden state is committed as soon as it is certain: once every
+    surviving state path passes through the same state at that time, no
+    future observation can change it. A state is also committed, at the
+    latest, lag observations after it was observed; surviving paths that
+    disagree with the committed state are then dropped so that the output
+    remains a single valid state path.
+    Only the backpointers of uncommitted observations are kept, so memory
+    is bounded by lag regardless of the length of the stream.
+    Notation used:
+        delta: log probability of the highest probability state path
+            ending in each state at the latest observation.
+        psi: backpointers of each uncommitted observation but the oldest.
+        num_pending: number of uncommitted observations.
+    """
+    def __init__(self, hmm, lag=DEFAULT_LAG):
+        """
+        Args:
+            hmm (HiddenMarkovModel): model used for decoding.
+            lag (int): maximum number of observations a state may remain
+                uncommitted. If None, states are only committed when the
+                surviving paths converge, which does not bound memory.
+        """
+        if(lag is not None and lag < 0):
+            raise ValueError("lag must be 0 or greater.")
+        self._hmm = hmm
+        self._lag = lag
+        self.reset()
+
+    def reset(self):
+        """ Discards all uncommitted observations and starts a new stream. """
+        self._delta = None
+        self._psi = deque()
+        self._num_pending = 0
+        self._t_index = 0
+
+    def push(self, observation):
+        """
+        Consumes the next observation of the stream.
+        Args:
+            observation (char): next observation, must be in all_obs.
+        Returns:
+            list<string>: hidden states committed by this observation,
+                continuing those previously returned.
+        """
+        hmm = self._hmm
+        hmm._check_legal_sequence([observation])
+        obs_index = hmm._obs_index[observation]
+        if(self._delta is None):
+            self._delta = hmm._viterbi_start(obs_index)
+        else:
+            self._delta, back = hmm._viterbi_step(
+                self._delta, self._t_index, obs_index
+            )
+            if(self._num_pending > 0):
+                self._psi.append(back)
+        self._num_pending += 1
+        self._t_index += 1
+
+        if(self._lag is not None and self._num_pending > self._lag):
+            self._force_oldest()
+        return self._commit_converged()
+
+    def decode_stream(self, observations):
+        """
+        Decodes an iterable of observations lazily.
+        Args:
+            observations (iterable<char>): observation stream O
+        Returns:
+            generator<string>: hidden state of each observation, in order.
+                The states of the last observations are produced once the
+                iterable is exhausted.
+        """
+        for observation in observations:
+            for state in self.push(observation):
+                yield state
+        for state in self.flush():
+            yield state
+
+    def flush(self):
+        """
+        Ends the stream. Uncommitted observations are decoded by following
+        the highest probability surviving path.
+        Returns:
+            list<string>: remaining hidden states of the stream.
+        """
+        if(self._num_pending == 0):
+            self.reset()
+            return []
+
+        path = self._traceback(self._best_state())
+        self.reset()
+        return [self._hmm._single_state_name(s_index) for s_index in path]
+
+    def _live_states(self):
+        """ States with a surviving path at the latest observation """
+        live = [
+            s_index for s_index in range(len(self._delta))
+            if self._delta[s_index] > NEG_INF
+        ]
+        if(len(live) == 0):
+            # no path has non-zero probability; follow state 0 like decode
+            live = [0]
+        return live
+
+    def _best_state(self):
+        """ Lowest indexed state with the highest delta """
+        best_state = 0
+        best_prob = NEG_INF
+        for s_index in range(len(self._delta)):
+            if self._delta[s_index] > best_prob:
+                best_prob = self._delta[s_index]
+                best_state = s_index
+        return best_state
+
+    def _traceback(self, s_index):
+        """ State path from the oldest uncommitted observation to s_index """
+        rev_path = [s_index]
+        for back in reversed(self._psi):
+            s_index = back[s_index]
+            rev_path.append(s_index)
+        return rev_path[::-1]
+
+    def _force_oldest(self):
+        """
+        Commits the oldest uncommitted observation to the state on the best
+        path by dropping surviving paths through any other state.
+        """
+        oldest = self._traceback(self._best_state())[0]
+        for s_index in self._live_states():
+            if(self._traceback(s_index)[0] != oldest):
+                self._delta[s_index] = NEG_INF
+
+    def _commit_converged(self):
+        """
+        Finds the latest observation at which all surviving paths share a
+        state and commits every observation up to it.
+        Returns:
+            list<string>: committed hidden states.
+        """
+        # psi[position] maps a state at position + 1 to one at position
+        ancestors = set(self._live_states())
+        position = len(self._psi)
+        while(len(ancestors) > 1 and position > 0):
+            position -= 1
+            back = self._psi[position]
+            ancestors = set(back[s_index] for s_index in ancestors)
+        if(len(ancestors) > 1):
+            return []
+
+        s_index = ancestors.pop()
+        rev_path = [s_index]
+        for back_position in range(position - 1, -1, -1):
+            s_index = self._psi[back_position][s_index]
+            rev_path.append(s_index)
+
+        for i in range(min(position + 1, len(self._psi))):
+            self._psi.popleft()
+        self._num_pending -= position + 1
+        return [
+            self._hmm._single_state_name(s_index)
+            for s_index in reversed(rev_path)
+        ]
+
+class ForwardFilter:
+    """
+    Incremental forward algorithm over an observation stream of a
+    HiddenMarkovModel. Pushing an observation updates the scaled alpha
+    vector and the log probability of the stream so far in a single
+    forward step, rather than evaluating the growing prefix again.
+    Notation used:
+        alpha: P(state at the latest observation | O so far), one value
+            per state of the model.
+        log_likelihood: log P(O so far | lambda)
+    """
+    def __init__(self, hmm):
+        """
+        Args:
+            hmm (HiddenMarkovModel): model used for filtering.
+        """
+        self._hmm = hmm
+        self.reset()
+
+    def reset(self):
+        """ Discards the stream and starts a new one. """
+        self._alpha = None
+        self._t_index = 0
+        self.log_likelihood = 0.0
+
+    def push(self, observation):
+        """
+        Consumes the next observation of the stream.
+        Args:
+            observation (char): next observation, must be in all_obs.
+        Returns:
+            float: log P(O|lambda) of all observations pushed so far.
+        """
+        hmm = self._hmm
+        hmm._check_legal_sequence([observation])
+        obs_index = hmm._obs_index[observation]
+        if(self._alpha is None):
+            alpha = hmm._forward_start(obs_index)
+        else:
+            alpha = hmm._forward_step(self._alpha, self._t_index, obs_index)
+        self._t_index += 1
+
+        total = sum(alpha)
+        self.log_likelihood += safe_log(total)
+        if(total != 0):
+            alpha = [prob / total for prob in alpha]
+        self._alpha = alpha
+        return self.log_likelihood
+
+    def state_distribution(self):
+        """
+        Returns:
+            dict<string:float>: P(single state at the latest observation
+                | O so far). Empty if nothing has been pushed.
+        """
+        hmm = self._hmm
+        distribution = dict()
+        if(self._alpha is None):
+            return distribution
+
+        for s_index, prob in enumerate(self._alpha):
+            state = hmm._single_state_name(s_index)
+            distribution[state] = distribution.get(state, 0.0) + prob
+        return distribution
@@ -1,7 +1,10 @@
 
 from copy import deepcopy
+from math import log
 import random as ran
 
+NEG_INF = float("-inf")
+
 def init_matrix(rows, columns, data_type="float"):
     """
     Initialize a matrix using lists with provided size: (rows,columns)
@@ -28,29 +31,17 @@ def init_matrix(rows, columns, data_type="float"):
         matrix.append(deepcopy(row))
     return matrix
 
-def init_3d_matrix(x, y, z):
+def safe_log(x):
     """
-    Initialize a 3-dim matrix using lists with provided size: (X,Y,Z).
+    Natural logarithm extended to zero probability.
     Args:
-        x (int)
-        y (int)
-        z (int)
+        x (float): probability in [0.0, 1.0]
     Return:
-        the zero matrix of specified size with zeroed float values.
+        float: log(x), or negative infinity when x is 0.
     """
-    d1 = []
-    for i in range(z):
-        d1.append(0.0)
-
-    d2 = []
-    for j in range(y):
-        d2.append(deepcopy(d1))
-
-    matrix = []
-    for k in range(x):
-        matrix.append(deepcopy(d2))
-
-    return matrix
+    if(x == 0):
+        return NEG_INF
+    return log(x)
 
 def init_matrix_uniform(row_len, column_len):
     """
@@ -78,6 +69,34 @@ def init_matrix_random(row_len, column_len):
     """
     return list(map(lambda x : _make_random_row(column_len), range(row_len)))
 
+def init_sparse_matrix_uniform(successors):
+    """
+    Initialize a sparse matrix such that all rows sum to 1 and all
+    elements in a row are the same.
+    Args:
+        successors (list<list<int>>): column indices present in each row.
+    Returns:
+        list<dict<int:float>>: uniformly distributed sparse matrix.
+    """
+    return [
+        dict((column, 1.0 / len(columns)) for column in columns)
+        for columns in successors
+    ]
+
+def init_sparse_matrix_random(successors):
+    """
+    Initialize a sparse matrix such that all rows sum to 1 and elements
+    are generated pseudo-randomly.
+    Args:
+        successors (list<list<int>>): column indices present in each row.
+    Returns:
+        list<dict<int:float>>: randomly distributed sparse matrix.
+    """
+    return [
+        dict(zip(columns, _make_random_row(len(columns))))
+        for columns in successors
+    ]
+
 def _make_random_row(num_elements):
     """ Generates a list of row_len random floats that sum to 1. """
     row = [ran.random() for i in range(num_elements)]
@@ -0,0 +1,59 @@
+"""
+Synthetic training data for the benchmarks. Labeled sequences are sampled
+from a random "true" HMM with sticky transitions and state dependent
+emissions so that the models built from them are neither uniform nor
+degenerate. Everything is generated from a seed; nothing is downloaded.
+"""
+import random
+
+def make_vocabularies(num_states, num_obs):
+    """
+    Returns:
+        list<string>: single states 's0'...
+        list<string>: observations 'o0'...
+    """
+    states = ['s' + str(i) for i in range(num_states)]
+    observations = ['o' + str(i) for i in range(num_obs)]
+    return states, observations
+
+def make_labeled_sequences(num_states, num_obs, num_sequences, length, seed=0):
+    """
+    Samples labeled sequences from a random HMM.
+    Args:
+        num_states (int): number of single hidden states.
+        num_obs (int): size of the observation vocabulary.
+        num_sequences (int): number of sequences to sample.
+        length (int): length of every sequence.
+        seed (int): seed of the random number generator.
+    Returns:
+        list<list<string>>: observation sequences
+        list<list<string>>: hidden state sequences
+    """
+    rand = random.Random(seed)
+    states, observations = make_vocabularies(num_states, num_obs)
+
+    # each state prefers staying put and a handful of observations
+    preferred_obs = [
+        rand.sample(observations, min(len(observations), 5))
+        for state in states
+    ]
+
+    obs_sequences = []
+    state_sequences = []
+    for i in range(num_sequences):
+        state_index = rand.randrange(num_states)
+        obs_sequence = []
+        state_sequence = []
+        for t in range(length):
+            if(rand.random() > 0.7):
+                state_index = rand.randrange(num_states)
+            if(rand.random() < 0.8):
+                obs = rand.choice(preferred_obs[state_index])
+            else:
+                obs = rand.choice(observations)
+            obs_sequence.append(obs)
+            state_sequence.append(states[state_index])
+        obs_sequences.append(obs_sequence)
+        state_sequences.append(state_sequence)
+
+    return obs_sequences, state_sequences
@@ -0,0 +1,231 @@
+"""
+Throughput benchmarks of SimpleHOHMM. Measures how evaluate, decode,
+learn and HiddenMarkovModelBuilder.build scale with the number of states,
+model order, vocabulary size and sequence length over a parameter grid.
+
+Usage (from the repository root):
+    python -m benchmarks.run
+    python -m benchmarks.run --grid full --cases decode,learn --output results.json
+
+Each result reports operations per second, processed observations per
+second and the peak memory allocated by one operation (tracemalloc).
+Results are written as JSON; a summary is printed to stderr.
+"""
+import argparse
+from copy import deepcopy
+from itertools import product
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import SimpleHOHMM
+from SimpleHOHMM import HiddenMarkovModelBuilder
+from SimpleHOHMM.engine import np
+
+from .data import make_labeled_sequences
+
+ENGINES = ["python"] if np is None else ["python", "numpy"]
+
+GRIDS = {
+    "quick": {
+        "states": [4, 16],
+        "order": [1, 2],
+        "obs": [20],
+        "length": [100],
+        "engine": ENGINES,
+    },
+    "full": {
+        "states": [4, 16, 64],
+        "order": [1, 2, 3],
+        "obs": [20, 2000],
+        "length": [100, 1000],
+        "engine": ENGINES,
+    },
+}
+
+CASES = ["build", "evaluate", "decode", "learn"]
+
+# grid points whose composite state space exceeds this are skipped
+MAX_COMPOSITE_STATES = 4096
+
+NUM_TRAINING_SEQUENCES = 20
+NUM_LEARN_SEQUENCES = 4
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument(
+        "--cases",
+        default=",".join(CASES),
+        help="comma separated subset of: " + ", ".join(CASES)
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="seconds each measurement is repeated for"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write, default stdout")
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(",")
+    for case in cases:
+        if(case not in CASES):
+            parser.error("unknown case: " + case)
+
+    results = []
+    for params in grid_points(GRIDS[args.grid]):
+        for case in cases:
+            result = run_case(case, params, args.min_time, args.seed)
+            results.append(result)
+            sys.stderr.write(format_result(result) + "\n")
+
+    report = {"metadata": metadata(args), "results": results}
+    if(resource is not None):
+        report["metadata"]["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if(args.output is None):
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+def grid_points(grid):
+    """ every combination of the grid small enough to run """
+    names = sorted(grid)
+    for values in product(*[grid[name] for name in names]):
+        params = dict(zip(names, values))
+        if(params["states"] ** params["order"] <= MAX_COMPOSITE_STATES):
+            yield params
+
+def run_case(case, params, min_time, seed):
+    """
+    Builds the inputs of a case outside of the measurement, then measures
+    repeated calls of the operation.
+    Returns:
+        dict: case, params, ops_per_sec, items_per_sec, seconds_per_op,
+            calls, peak_memory_bytes
+    """
+    obs_sequences, state_sequences = make_labeled_sequences(
+        params["states"],
+        params["obs"],
+        NUM_TRAINING_SEQUENCES,
+        params["length"],
+        seed=seed
+    )
+    builder = HiddenMarkovModelBuilder()
+    builder.add_batch_training_examples(obs_sequences, state_sequences)
+    build_args = dict(
+        highest_order=params["order"],
+        k_smoothing=0.01,
+        synthesize_states=True,
+        sparse_transitions=params["order"] > 1,
+        engine=params["engine"]
+    )
+
+    setup = None
+    if(case == "build"):
+        operation = lambda: builder.build(**build_args)
+        items = NUM_TRAINING_SEQUENCES * params["length"]
+    else:
+        hmm = builder.build(**build_args)
+        sequence = obs_sequences[0]
+        if(case == "evaluate"):
+            operation = lambda: hmm.evaluate(sequence)
+            items = params["length"]
+        elif(case == "decode"):
+            operation = lambda: hmm.decode(sequence)
+            items = params["length"]
+        else: # 'learn', a single Baum-Welch iteration
+            # learn updates the model, so every call starts from a copy of
+            # the built model made outside of the measurement
+            learn_sequences = obs_sequences[:NUM_LEARN_SEQUENCES]
+            setup = lambda: deepcopy(hmm)
+            operation = lambda model: model.learn(learn_sequences, iterations=1)
+            items = NUM_LEARN_SEQUENCES * params["length"]
+
+    calls, elapsed = measure_time(operation, min_time, setup)
+    return {
+        "case": case,
+        "params": params,
+        "ops_per_sec": calls / elapsed,
+        "items_per_sec": calls * items / elapsed,
+        "seconds_per_op": elapsed / calls,
+        "calls": calls,
+        "peak_memory_bytes": measure_peak_memory(operation, setup),
+    }
+
+def measure_time(operation, min_time, setup=None):
+    """
+    Calls operation once to warm up, then repeatedly until its calls have
+    taken min_time seconds.
+    Args:
+        setup (callable): called before each call of operation, outside of
+            the measurement. Its result is passed to operation.
+    Returns:
+        int: number of timed calls
+        float: seconds taken by the timed calls
+    """
+    operation(*_arguments(setup))
+    calls = 0
+    elapsed = 0.0
+    while(calls == 0 or elapsed < min_time):
+        args = _arguments(setup)
+        start = time.perf_counter()
+        operation(*args)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return calls, elapsed
+
+def measure_peak_memory(operation, setup=None):
+    """ bytes allocated at the peak of a single call of operation """
+    args = _arguments(setup)
+    tracemalloc.start()
+    try:
+        operation(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _arguments(setup):
+    """ arguments of an operation: the result of setup, if given """
+    return () if setup is None else (setup(),)
+
+def metadata(args):
+    return {
+        "simplehohmm_version": SimpleHOHMM.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "numpy": None if np is None else np.__version__,
+        "grid": args.grid,
+        "min_time": args.min_time,
+        "seed": args.seed,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def format_result(result):
+    params = result["params"]
+    return "{:<9} states={:<3} order={} obs={:<5} length={:<5} {:<7} {:>12.1f} ops/s {:>14.0f} obs/s {:>10.1f} KiB".format(
+        result["case"],
+        params["states"],
+        params["order"],
+        params["obs"],
+        params["length"],
+        params["engine"],
+        result["ops_per_sec"],
+        result["items_per_sec"],
+        result["peak_memory_bytes"] / 1024.0
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import unittest
 from .test_builder import TestHMMBuilder
+from .test_engine import TestNumpyEngine
 from .test_hmm import TestHMM
+from .test_streaming import TestStreaming
 
 def test_suite():
     loader = unittest.TestLoader()
 
-    test_classes_to_run = [TestHMMBuilder, TestHMM]
+    test_classes_to_run = [
+        TestHMMBuilder, TestHMM, TestNumpyEngine, TestStreaming
+    ]
     suites_list = []
 
     for test_class in test_classes_to_run:
@@ -1,6 +1,10 @@
+import pickle
 import unittest
 
 from SimpleHOHMM import HiddenMarkovModelBuilder as Builder
+from SimpleHOHMM.builder import _add_one_at_a_time
+from SimpleHOHMM.counts import TrainingCounts
+from SimpleHOHMM.states import CompositeStates
 
 class TestHMMBuilder(unittest.TestCase):
 
@@ -164,3 +168,207 @@ class TestHMMBuilder(unittest.TestCase):
         self.assertEqual(len(builder._state_sequences), 0)
         self.assertIsNone(builder._single_states)
         self.assertIsNone(builder._all_obs)
+
+    def test_build_sparse_transitions(self):
+        builder = Builder()
+        builder.add_batch_training_examples(self._obs, self._states)
+        for order in range(1, 4):
+            sparse_hmm = builder.build(
+                highest_order=order,
+                synthesize_states=True,
+                sparse_transitions=True
+            )
+            dense_hmm = builder.build(
+                highest_order=order,
+                synthesize_states=True
+            )
+            params = sparse_hmm.get_parameters()
+            for row in params["A"]:
+                self.assertEqual(len(row), 2)
+                if(sum(row.values()) > 0):
+                    self.assertAlmostEqual(sum(row.values()), 1)
+            # without smoothing, both representations define the same model
+            for obs in self._obs:
+                self.assertAlmostEqual(
+                    sparse_hmm.evaluate(obs),
+                    dense_hmm.evaluate(obs)
+                )
+                self.assertEqual(sparse_hmm.decode(obs), dense_hmm.decode(obs))
+
+        sparse_hmm = builder.build(
+            highest_order=2,
+            k_smoothing=.01,
+            sparse_transitions=True
+        )
+        for row in sparse_hmm.get_parameters()["A"]:
+            self.assertAlmostEqual(sum(row.values()), 1)
+        self.assertGreater(sparse_hmm.learn(self._obs, k_smoothing=.01), 0)
+
+    def test_build_unsupervised_sparse(self):
+        builder = Builder()
+        for distribution in ["uniform", "random"]:
+            hmm = builder.build_unsupervised(
+                single_states=['healthy', 'fever'],
+                all_obs=['normal', 'cold', 'dizzy'],
+                distribution=distribution,
+                highest_order=3,
+                sparse_transitions=True
+            )
+            for row in hmm.get_parameters()["A"]:
+                self.assertEqual(len(row), 2)
+                self.assertAlmostEqual(sum(row.values()), 1)
+
+    def test_composite_states(self):
+        space = CompositeStates(['a', 'b', 'c'])
+        self.assertEqual(space.names(2)[space.parse('c-a', 2)], 'c-a')
+        code = space.encode(['b', 'c', 'a'])
+        self.assertEqual(space.name(code, 3), 'b-c-a')
+        self.assertEqual(space.name(space.project(code, 2), 2), 'c-a')
+        self.assertEqual(
+            [space.name(c, 3) for c in space.successors(code, 3)],
+            ['c-a-a', 'c-a-b', 'c-a-c']
+        )
+        with self.assertRaises(ValueError):
+            space.parse('a-d', 2)
+
+        # labels containing the separator
+        space = CompositeStates(['x-1', 'y'])
+        self.assertEqual(space.decode(space.parse('y-x-1-x-1', 3), 3), ['y', 'x-1', 'x-1'])
+
+    def test_build_hyphenated_states(self):
+        states = [
+            [state.replace('fever', 'high-fever') for state in seq]
+            for seq in self._states
+        ]
+        renamed = Builder()
+        renamed.add_batch_training_examples(self._obs, states)
+        builder = Builder()
+        builder.add_batch_training_examples(self._obs, self._states)
+        for order in range(1, 4):
+            for synthesize in [True, False]:
+                for sparse in [True, False]:
+                    args = dict(
+                        highest_order=order,
+                        k_smoothing=.01,
+                        synthesize_states=synthesize,
+                        sparse_transitions=sparse
+                    )
+                    renamed_hmm = renamed.build(**args)
+                    hmm = builder.build(**args)
+                    for obs in self._obs:
+                        self.assertAlmostEqual(renamed_hmm.evaluate(obs), hmm.evaluate(obs))
+                        self.assertEqual(
+                            renamed_hmm.decode(obs),
+                            [s.replace('fever', 'high-fever') for s in hmm.decode(obs)]
+                        )
+
+    def test_build_training_stream(self):
+        builder = Builder()
+        builder.add_batch_training_examples(self._obs, self._states)
+        stream_builder = Builder()
+        stream_builder.add_training_stream(
+            zip(self._obs[:4], self._states[:4]),
+            highest_order=3
+        )
+        stream_builder.add_training_stream(
+            iter(zip(self._obs[4:], self._states[4:])),
+            highest_order=3
+        )
+        self.assertEqual(len(stream_builder._obs_sequences), 0)
+        for order in range(1, 4):
+            for do_synthesize in [True, False]:
+                params = builder.build(
+                    highest_order=order,
+                    k_smoothing=.01,
+                    synthesize_states=do_synthesize
+                ).get_parameters()
+                stream_params = stream_builder.build(
+                    highest_order=order,
+                    k_smoothing=.01,
+                    synthesize_states=do_synthesize
+                ).get_parameters()
+                self.assertEqual(params, stream_params)
+
+        with self.assertRaises(ValueError):
+            stream_builder.build(highest_order=4)
+        with self.assertRaises(ValueError):
+            stream_builder.add_training_stream([], highest_order=2)
+        stream_builder.clear_all_sets()
+        self.assertIsNone(stream_builder._counts)
+
+    def test_training_counts(self):
+        counts = TrainingCounts(highest_order=2)
+        counts.add(['x', 'y', 'y'], ['a', 'b', 'b'])
+        counts.add_batch([['y', 'x'], ['x']], [['b', 'b'], ['a']])
+        self.assertEqual(counts.all_obs, set(['x', 'y']))
+        self.assertEqual(counts.states[0], set(['a', 'b']))
+        self.assertEqual(counts.states[1], set(['a-b', 'b-b']))
+        self.assertEqual(counts.num_starts, [3, 2])
+        self.assertEqual(counts.start_counts(1), {'a': 2, 'b': 1})
+        self.assertEqual(counts.start_counts(2), {'a-b': 1, 'b-b': 1})
+        self.assertEqual(
+            counts.transition_counts(1),
+            {('a', 'b'): 1, ('b', 'b'): 2}
+        )
+        self.assertEqual(counts.transition_counts(2), {('a-b', 'b-b'): 1})
+        self.assertEqual(
+            counts.emission_counts(),
+            {('a', 'x'): 2, ('b', 'y'): 3, ('b', 'x'): 1}
+        )
+
+    def test_count_shards(self):
+        builder = Builder()
+        builder.add_batch_training_examples(self._obs, self._states)
+        shard_builders = [Builder(), Builder()]
+        shard_builders[0].add_batch_training_examples(self._obs[:3], self._states[:3])
+        shard_builders[1].add_training_stream(
+            zip(self._obs[3:], self._states[3:]),
+            highest_order=2
+        )
+        merged_builder = Builder()
+        for shard_builder in shard_builders:
+            shard = pickle.loads(pickle.dumps(shard_builder.get_counts(2)))
+            merged_builder.add_counts(shard)
+
+        for order in range(1, 3):
+            for n_jobs in [1, 2]:
+                hmm = builder.build(highest_order=order, k_smoothing=.01)
+                for other_hmm in [
+                    merged_builder.build(highest_order=order, k_smoothing=.01),
+                    builder.build(highest_order=order, k_smoothing=.01, n_jobs=n_jobs)
+                ]:
+                    self.assertEqual(
+                        self._named_parameters(hmm),
+                        self._named_parameters(other_hmm)
+                    )
+
+        with self.assertRaises(ValueError):
+            builder.build(n_jobs=0)
+        with self.assertRaises(ValueError):
+            merged_builder.add_counts(TrainingCounts(highest_order=1))
+
+    def test_add_one_at_a_time(self):
+        for value in [0, 1e-9, .01, .5, 1.5, 2 ** 52 - 3.5, 2 ** 53 - 2, 2 ** 53 + 2]:
+            for count in [0, 1, 7, 1000]:
+                expected = value
+                if(value != 0):
+                    for i in range(count):
+                        expected += 1
+                else:
+                    expected += count
+                self.assertEqual(_add_one_at_a_time(value, count), expected)
+
+    def _named_parameters(self, hmm):
+        """ model parameters keyed by state and observation names """
+        params = hmm.get_parameters()
+        states = params["all_states"]
+        single_states = params["single_states"]
+        A = dict(
+            ((states[i], states[j]), round(p, 12))
+            for i, row in enumerate(params["A"]) for j, p in enumerate(row)
+        )
+        B = dict(
+            ((single_states[i], params["all_obs"][j]), round(p, 12))
+            for i, row in enumerate(params["B"]) for j, p in enumerate(row)
+        )
+        return A, B, params["pi"]
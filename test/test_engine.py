@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from SimpleHOHMM import HiddenMarkovModel as HMM
+from SimpleHOHMM import HiddenMarkovModelBuilder as Builder
+from SimpleHOHMM.engine import np
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestNumpyEngine(unittest.TestCase):
+
+    def setUp(self):
+        self._obs = [
+            ['normal', 'cold', 'dizzy', 'dizzy','normal','normal'],
+            ['dizzy', 'cold', 'dizzy', 'normal','normal','normal'],
+            ['normal', 'cold', 'dizzy', 'dizzy','cold','normal'],
+            ['dizzy', 'dizzy', 'dizzy', 'dizzy', 'cold', 'cold'],
+            ['cold', 'cold', 'cold', 'normal', 'dizzy', 'normal'],
+            ['dizzy', 'normal', 'cold', 'cold', 'dizzy', 'dizzy']
+        ]
+        self._states = [
+            ['healthy', 'healthy', 'fever', 'fever', 'healthy', 'healthy'],
+            ['fever', 'fever', 'fever', 'healthy', 'healthy', 'fever'],
+            ['healthy', 'healthy', 'fever', 'fever', 'fever', 'healthy'],
+            ['fever', 'fever', 'fever', 'fever', 'fever', 'fever'],
+            ['fever', 'fever', 'fever', 'healthy', 'fever', 'healthy'],
+            ['fever', 'healthy', 'fever', 'fever', 'fever', 'fever']
+        ]
+        self._builder = Builder()
+        self._builder.add_batch_training_examples(self._obs, self._states)
+        self._sequence = ['normal', 'cold', 'dizzy', 'dizzy','cold','normal']
+
+    def tearDown(self):
+        self._builder = None
+
+    def _build_pair(self, order, synthesize_states=True, sparse=False):
+        return [
+            self._builder.build(
+                highest_order=order,
+                k_smoothing=.01,
+                synthesize_states=synthesize_states,
+                sparse_transitions=sparse,
+                engine=engine
+            ) for engine in ("python", "numpy")
+        ]
+
+    def test_evaluate_matches_python(self):
+        for order in range(1, 4):
+            for synthesize in [True, False]:
+                py_hmm, np_hmm = self._build_pair(order, synthesize)
+                for seq in self._obs + [self._sequence[:1]]:
+                    self.assertAlmostEqual(
+                        py_hmm.evaluate(seq),
+                        np_hmm.evaluate(seq)
+                    )
+
+    def test_decode_matches_python(self):
+        for order in range(1, 4):
+            py_hmm, np_hmm = self._build_pair(order)
+            for seq in self._obs + [self._sequence[:1]]:
+                self.assertEqual(py_hmm.decode(seq), np_hmm.decode(seq))
+
+    def test_decode_low_memory_matches_python(self):
+        for order in range(1, 4):
+            for sparse in [False, True]:
+                py_hmm, np_hmm = self._build_pair(order, sparse=sparse)
+                for seq in self._obs + [self._sequence[:1]]:
+                    decoded = py_hmm.decode(seq)
+                    self.assertEqual(py_hmm.decode(seq, low_memory=True), decoded)
+                    self.assertEqual(np_hmm.decode(seq, low_memory=True), decoded)
+
+    def test_learn_matches_python(self):
+        py_hmm, np_hmm = self._build_pair(1)
+        py_iterations = py_hmm.learn(self._obs, k_smoothing=0.005)
+        np_iterations = np_hmm.learn(self._obs, k_smoothing=0.005)
+        self.assertEqual(py_iterations, np_iterations)
+        self.assertAlmostEqual(
+            py_hmm.evaluate(self._sequence),
+            np_hmm.evaluate(self._sequence)
+        )
+
+    def test_expected_counts_low_memory(self):
+        sequences = self._obs + [self._sequence[:1]]
+        for order in range(1, 4):
+            py_hmm, np_hmm = self._build_pair(order)
+            expected = py_hmm._expected_counts(sequences)
+            for hmm in [py_hmm, np_hmm]:
+                stats = hmm._expected_counts(sequences, low_memory=True)
+                self.assertEqual(stats.num_sequences, expected.num_sequences)
+                self.assertAlmostEqual(stats.log_likelihood, expected.log_likelihood)
+                for name in ["start", "trans_total", "emit_total"]:
+                    self.assertTrue(np.allclose(getattr(stats, name), getattr(expected, name)))
+                for name in ["trans", "emit"]:
+                    self.assertTrue(np.allclose(getattr(stats, name), getattr(expected, name)))
+
+    def test_learn_viterbi_matches_python(self):
+        for order in range(1, 4):
+            py_hmm, np_hmm = self._build_pair(order)
+            py_iterations = py_hmm.learn(self._obs, k_smoothing=0.005, method="viterbi")
+            np_iterations = np_hmm.learn(self._obs, k_smoothing=0.005, method="viterbi")
+            self.assertEqual(py_iterations, np_iterations)
+            self.assertAlmostEqual(
+                py_hmm.evaluate_log(self._sequence),
+                np_hmm.evaluate_log(self._sequence)
+            )
+
+    def test_many_matches_single(self):
+        sequences = self._obs + [[], self._sequence[:1], self._sequence[:3]]
+        for order in range(1, 4):
+            py_hmm, np_hmm = self._build_pair(order)
+            probs = np_hmm.evaluate_many(sequences, batch_size=3)
+            log_probs = np_hmm.evaluate_log_many(sequences, batch_size=3)
+            decoded = np_hmm.decode_many(sequences, batch_size=3)
+            self.assertEqual(len(probs), len(sequences))
+            for i, seq in enumerate(sequences):
+                self.assertAlmostEqual(probs[i], py_hmm.evaluate(seq))
+                self.assertEqual(decoded[i], np_hmm.decode(seq))
+                if(len(seq) > 0):
+                    self.assertAlmostEqual(log_probs[i], py_hmm.evaluate_log(seq))
+
+    def test_sparse_matches_python(self):
+        for order in range(1, 4):
+            py_hmm, np_hmm = self._build_pair(order, synthesize_states=False, sparse=True)
+            for seq in self._obs:
+                self.assertAlmostEqual(py_hmm.evaluate(seq), np_hmm.evaluate(seq))
+                self.assertEqual(py_hmm.decode(seq), np_hmm.decode(seq))
+            self.assertEqual(
+                np_hmm.decode_many(self._obs, batch_size=4),
+                [py_hmm.decode(seq) for seq in self._obs]
+            )
+
+            py_hmm.learn(self._obs, k_smoothing=0.005, iterations=3)
+            np_hmm.learn(self._obs, k_smoothing=0.005, iterations=3)
+            py_A = py_hmm.get_parameters()["A"]
+            for row, py_row in zip(np_hmm.get_parameters()["A"], py_A):
+                self.assertEqual(sorted(row.keys()), sorted(py_row.keys()))
+                for s_index in row:
+                    self.assertAlmostEqual(row[s_index], py_row[s_index])
+
+    def test_decode_nbest_matches_python(self):
+        for order in range(1, 4):
+            for sparse in [False, True]:
+                py_hmm, np_hmm = self._build_pair(order, sparse=sparse)
+                for seq in self._obs + [self._sequence[:1]]:
+                    py_nbest = py_hmm.decode_nbest(seq, 5)
+                    np_nbest = np_hmm.decode_nbest(seq, 5)
+                    self.assertEqual(len(py_nbest), len(np_nbest))
+                    for (py_path, py_score), (np_path, np_score) in zip(py_nbest, np_nbest):
+                        self.assertAlmostEqual(py_score, np_score)
+                    # higher order paths of equal single states are merged
+                    self.assertEqual(
+                        len(set(tuple(path) for path, score in np_nbest)),
+                        len(np_nbest)
+                    )
+
+    def test_posteriors_matches_python(self):
+        for order in range(1, 4):
+            for sparse in [False, True]:
+                py_hmm, np_hmm = self._build_pair(order, sparse=sparse)
+                sequences = self._obs + [self._sequence[:1], []]
+                np_many = np_hmm.posteriors_many(sequences, batch_size=3)
+                for seq, np_batched in zip(sequences, np_many):
+                    np_posteriors = np_hmm.posteriors(seq)
+                    py_posteriors = np.array(py_hmm.posteriors(seq)).reshape(np_posteriors.shape)
+                    self.assertEqual(np_posteriors.shape, np_batched.shape)
+                    self.assertTrue(np.allclose(py_posteriors, np_posteriors))
+                    self.assertTrue(np.allclose(np_batched, np_posteriors))
+                    self.assertEqual(py_hmm.decode_posterior(seq), np_hmm.decode_posterior(seq))
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "model.hmm")
+            for sparse in [False, True]:
+                hmm = self._builder.build(
+                    highest_order=2,
+                    k_smoothing=.01,
+                    sparse_transitions=sparse
+                )
+                hmm.save(path)
+                loaded = HMM.load(path, engine="numpy")
+                for seq in self._obs:
+                    self.assertAlmostEqual(loaded.evaluate(seq), hmm.evaluate(seq))
+                    self.assertEqual(loaded.decode(seq), hmm.decode(seq))
+
+                # learning in worker processes copies the loaded model
+                loaded.learn(self._obs, k_smoothing=.01, iterations=2, n_jobs=2)
+                hmm.learn(self._obs, k_smoothing=.01, iterations=2)
+                for seq in self._obs:
+                    self.assertAlmostEqual(loaded.evaluate(seq), hmm.evaluate(seq))
+        finally:
+            shutil.rmtree(directory)
@@ -1,6 +1,20 @@
+from copy import deepcopy
+from itertools import product
+from math import log
+from multiprocessing import Pool
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
 import unittest
 
 from SimpleHOHMM import HiddenMarkovModel as HMM
+from SimpleHOHMM import Profiler
+from SimpleHOHMM import SharedModel
+from SimpleHOHMM.shared import shared_memory
+from SimpleHOHMM.storage import _array_bytes, decode_model, encode_model, pack_header
 
 class TestHMM(unittest.TestCase):
 
@@ -98,3 +112,448 @@ class TestHMM(unittest.TestCase):
         self.assertGreater(num_iterations, 0)
         self.test_hmm_evaluate()
         self.test_hmm_decode()
+
+        # an empty sequence would score -inf and stop learning at once
+        for method in ["baum-welch", "viterbi"]:
+            with self.assertRaises(ValueError):
+                self._hmm.learn(sequences + [[]], method=method)
+        with self.assertRaises(ValueError):
+            self._hmm.learn_online(sequences + [[]], batch_size=2)
+
+    def test_hmm_decode_low_memory(self):
+        for length in [1, 2, 3, 4, 5, 10, 60]:
+            sequence = (self._sequence * 10)[:length]
+            self.assertEqual(
+                self._hmm.decode(sequence, low_memory=True),
+                self._hmm.decode(sequence)
+            )
+            self.assertEqual(
+                self._hmm._viterbi_low_memory(sequence),
+                self._hmm._best_path(sequence)
+            )
+        self.assertEqual(self._hmm.decode([], low_memory=True), [])
+        with self.assertRaises(ValueError):
+            self._hmm.decode(self._sequence, beam=2, low_memory=True)
+
+    def test_hmm_learn_low_memory(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal', 'cold', 'dizzy', 'dizzy','cold','normal'],
+            ['dizzy'],
+            ['cold', 'cold', 'dizzy','normal','normal'],
+        ]
+        low_memory_hmm = HMM(**deepcopy(self._hmm.get_parameters()))
+        iterations = self._hmm.learn(sequences, k_smoothing=0.01, iterations=4)
+        low_memory_iterations = low_memory_hmm.learn(
+            sequences, k_smoothing=0.01, iterations=4, low_memory=True
+        )
+        self.assertEqual(iterations, low_memory_iterations)
+        for name in ["A", "B"]:
+            rows = self._hmm.get_parameters()[name]
+            low_memory_rows = low_memory_hmm.get_parameters()[name]
+            for row, low_memory_row in zip(rows, low_memory_rows):
+                for value, low_memory_value in zip(row, low_memory_row):
+                    self.assertAlmostEqual(value, low_memory_value)
+
+    def test_hmm_learn_viterbi(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal'],
+            ['normal', 'cold', 'normal','dizzy','normal'],
+            ['dizzy', 'dizzy', 'dizzy','cold','normal'],
+            ['cold', 'cold', 'dizzy','normal','normal'],
+        ]
+        # a single iteration estimates B from the decoded states
+        decoded = [self._hmm.decode(seq) for seq in sequences]
+        self.assertEqual(self._hmm.learn(sequences, iterations=1, method="viterbi"), 1)
+        params = self._hmm.get_parameters()
+        for s_index, state in enumerate(params["all_states"]):
+            emitted = [
+                o for seq, states in zip(sequences, decoded)
+                for o, s in zip(seq, states) if s == state
+            ]
+            for o_index, obs in enumerate(params["all_obs"]):
+                self.assertAlmostEqual(
+                    params["B"][s_index][o_index],
+                    emitted.count(obs) / float(len(emitted))
+                )
+
+        scores = []
+        num_iterations = self._hmm.learn(
+            sequences,
+            k_smoothing=0.005,
+            method="viterbi",
+            callback=lambda *args: scores.append(args[1])
+        )
+        self.assertGreater(num_iterations, 0)
+        self.assertEqual(len(scores), num_iterations + 1)
+        # converged: the paths decoded next are unchanged
+        self.assertEqual(self._hmm.learn(sequences, k_smoothing=0.005, method="viterbi"), 1)
+        with self.assertRaises(ValueError):
+            self._hmm.learn(sequences, method="hard")
+
+    def test_hmm_learn_online(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal'],
+            ['normal', 'cold', 'normal','dizzy','normal'],
+            ['dizzy', 'dizzy', 'dizzy','cold','normal'],
+            ['dizzy', 'dizzy', 'normal','normal','normal'],
+            ['cold', 'cold', 'dizzy','normal','normal'],
+        ]
+        params = deepcopy(self._hmm.get_parameters())
+
+        # a single batch replaces the counts: one Baum-Welch iteration
+        batch_hmm = HMM(**deepcopy(params))
+        batch_hmm.learn(sequences, k_smoothing=0.01, iterations=1)
+        iterations = self._hmm.learn_online(
+            (seq for seq in sequences),
+            batch_size=len(sequences),
+            k_smoothing=0.01
+        )
+        self.assertEqual(iterations, 1)
+        self.assertEqual(self._hmm.get_parameters(), batch_hmm.get_parameters())
+
+        calls = []
+        online_hmm = HMM(**deepcopy(params))
+        iterations = online_hmm.learn_online(
+            sequences,
+            batch_size=2,
+            passes=2,
+            callback=lambda *args: calls.append(args)
+        )
+        self.assertEqual(iterations, 6)
+        self.assertEqual([call[0] for call in calls], list(range(6)))
+        for row in online_hmm.get_parameters()["A"]:
+            self.assertAlmostEqual(sum(row), 1.0)
+        self.assertGreater(
+            sum(map(online_hmm.evaluate_log, sequences)),
+            sum(map(HMM(**params).evaluate_log, sequences))
+        )
+
+        with self.assertRaises(ValueError):
+            online_hmm.learn_online(iter(sequences), passes=2)
+        with self.assertRaises(ValueError):
+            online_hmm.learn_online(sequences, step_decay=0.5)
+        with self.assertRaises(ValueError):
+            online_hmm.learn_online(sequences, batch_size=0)
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            HMM([[1.0]], [[1.0]], [{'a': 1.0}], ['x'], ['a'], engine='c')
+
+    def test_hmm_evaluate_log(self):
+        self.assertAlmostEqual(
+            self._hmm.evaluate_log(self._sequence),
+            log(self._hmm.evaluate(self._sequence))
+        )
+        long_sequence = self._sequence * 1000
+        log_prob = self._hmm.evaluate_log(long_sequence)
+        self.assertLess(log_prob, 0)
+        self.assertGreater(log_prob, float("-inf"))
+        self.assertEqual(self._hmm.evaluate(long_sequence), 0)
+
+    def test_hmm_long_sequence(self):
+        long_sequence = self._sequence * 1000
+        self.assertEqual(
+            len(self._hmm.decode(long_sequence)),
+            len(long_sequence)
+        )
+        self.assertEqual(self._hmm.learn([long_sequence], iterations=1), 1)
+        self.test_hmm_evaluate()
+
+    def test_hmm_out_of_vocabulary(self):
+        with self.assertRaises(ValueError):
+            self._hmm.evaluate(['normal', 'sneezy'])
+        with self.assertRaises(ValueError):
+            self._hmm.decode(['sneezy'])
+
+    def test_hmm_many(self):
+        sequences = [self._sequence, [], self._sequence[:2]]
+        probs = self._hmm.evaluate_many(sequences)
+        decoded = self._hmm.decode_many(sequences)
+        for i, seq in enumerate(sequences):
+            self.assertAlmostEqual(probs[i], self._hmm.evaluate(seq))
+            self.assertEqual(decoded[i], self._hmm.decode(seq))
+        with self.assertRaises(ValueError):
+            self._hmm.decode_many([self._sequence, ['sneezy']])
+
+    def test_hmm_learn_parallel(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal'],
+            ['normal', 'cold', 'normal','dizzy','normal'],
+            ['dizzy', 'dizzy', 'dizzy','cold','normal'],
+            ['cold', 'cold', 'dizzy','normal','normal'],
+        ]
+        params = self._hmm.get_parameters()
+        serial_hmm = HMM(
+            A=deepcopy(params["A"]),
+            B=deepcopy(params["B"]),
+            pi=deepcopy(params["pi"]),
+            all_obs=params["all_obs"],
+            all_states=params["all_states"]
+        )
+        serial_iterations = serial_hmm.learn(sequences, iterations=3)
+        parallel_iterations = self._hmm.learn(sequences, iterations=3, n_jobs=2)
+        self.assertEqual(serial_iterations, parallel_iterations)
+        serial_A = serial_hmm.get_parameters()["A"]
+        for row, serial_row in zip(self._hmm.get_parameters()["A"], serial_A):
+            for value, serial_value in zip(row, serial_row):
+                self.assertAlmostEqual(value, serial_value)
+        with self.assertRaises(ValueError):
+            self._hmm.learn(sequences, n_jobs=0)
+
+    def test_hmm_profiler(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal'],
+            ['dizzy', 'dizzy', 'dizzy','cold','normal'],
+        ]
+        calls = []
+        profiler = Profiler()
+        self._hmm.set_profiler(profiler)
+        self._hmm.evaluate(self._sequence)
+        self._hmm.decode(self._sequence)
+        iterations = self._hmm.learn(
+            sequences,
+            iterations=3,
+            callback=lambda *args: calls.append(args)
+        )
+        self._hmm.learn(sequences, iterations=1, n_jobs=2)
+
+        timers = profiler.summary()["timers"]
+        self.assertEqual(timers["evaluate"]["count"], 1)
+        self.assertNotIn("evaluate_log", timers)
+        self.assertEqual(timers["decode"]["count"], 1)
+        self.assertEqual(timers["learn"]["count"], 2)
+        self.assertEqual(timers["m_step"]["count"], 4)
+        self.assertEqual(timers["forward"]["count"], 8)
+        self.assertEqual(profiler.counters["iterations"], 4)
+        self.assertEqual(profiler.counters["sequences"], 8)
+        self.assertEqual(profiler.counters["observations"], 40)
+
+        # scored before each of the first 3 re-estimations
+        self.assertEqual(iterations, 3)
+        self.assertEqual([call[0] for call in calls], [0, 1, 2])
+        self.assertIsNone(calls[0][2])
+        for prior, call in zip(calls, calls[1:]):
+            self.assertAlmostEqual(call[2], call[1] - prior[1])
+            self.assertGreaterEqual(call[3], prior[3])
+
+        self._hmm.set_profiler(None)
+        self._hmm.evaluate(self._sequence)
+        self.assertEqual(profiler.timers["evaluate"].count, 1)
+
+    def test_hmm_expected_counts_score(self):
+        sequences = [self._sequence, self._sequence[:3]]
+        stats = self._hmm._expected_counts(sequences)
+        self.assertEqual(stats.num_sequences, 2)
+        self.assertAlmostEqual(
+            stats.log_likelihood,
+            sum(map(self._hmm.evaluate_log, sequences))
+        )
+
+    def test_hmm_decode_beam(self):
+        decoded, exact = self._hmm.decode(self._sequence, beam=2)
+        self.assertTrue(exact)
+        self.assertEqual(decoded, self._hmm.decode(self._sequence))
+
+        decoded, exact = self._hmm.decode(self._sequence, beam=1)
+        self.assertFalse(exact)
+        self.assertEqual(len(decoded), len(self._sequence))
+
+        decoded, exact = self._hmm.decode(self._sequence, threshold=1e-12)
+        self.assertTrue(exact)
+        self.assertEqual(decoded, self._hmm.decode(self._sequence))
+        self.assertEqual(self._hmm.decode([], beam=1), ([], True))
+        with self.assertRaises(ValueError):
+            self._hmm.decode(self._sequence, beam=0)
+        with self.assertRaises(ValueError):
+            self._hmm.decode(self._sequence, threshold=1.5)
+
+    def test_hmm_decode_nbest(self):
+        # every state sequence, scored by log P(O,S|lambda)
+        params = self._hmm.get_parameters()
+        states = params["all_states"]
+        obs = [params["all_obs"].index(o) for o in self._sequence]
+        expected = []
+        for path in product(range(len(states)), repeat=len(obs)):
+            score = log(params["pi"][0][states[path[0]]] * params["B"][path[0]][obs[0]])
+            for t in range(1, len(obs)):
+                score += log(params["A"][path[t - 1]][path[t]] * params["B"][path[t]][obs[t]])
+            expected.append(score)
+        expected.sort(reverse=True)
+
+        nbest = self._hmm.decode_nbest(self._sequence, len(expected))
+        self.assertEqual(len(nbest), len(expected))
+        for (path, score), expected_score in zip(nbest, expected):
+            self.assertAlmostEqual(score, expected_score)
+        self.assertEqual(len(set(tuple(path) for path, score in nbest)), len(expected))
+        self.assertEqual(self._hmm.decode_nbest(self._sequence, 1)[0][0], self._hmm.decode(self._sequence))
+        self.assertEqual(self._hmm.decode_nbest([], 3), [])
+        with self.assertRaises(ValueError):
+            self._hmm.decode_nbest(self._sequence, 0)
+
+    def test_hmm_posteriors(self):
+        # P(s at t|O) by summing P(O,S|lambda) over every state sequence
+        params = self._hmm.get_parameters()
+        states = params["all_states"]
+        obs = [params["all_obs"].index(o) for o in self._sequence]
+        expected = [[0.0] * len(states) for o in obs]
+        for path in product(range(len(states)), repeat=len(obs)):
+            prob = params["pi"][0][states[path[0]]] * params["B"][path[0]][obs[0]]
+            for t in range(1, len(obs)):
+                prob *= params["A"][path[t - 1]][path[t]] * params["B"][path[t]][obs[t]]
+            for t, s_index in enumerate(path):
+                expected[t][s_index] += prob
+        total = self._hmm.evaluate(self._sequence)
+
+        posteriors = self._hmm.posteriors(self._sequence)
+        self.assertEqual(len(posteriors), len(self._sequence))
+        for row, expected_row in zip(posteriors, expected):
+            for prob, expected_prob in zip(row, expected_row):
+                self.assertAlmostEqual(prob, expected_prob / total)
+
+        self.assertEqual(self._hmm.posteriors_many([self._sequence, []]), [posteriors, []])
+        self.assertEqual(
+            self._hmm.decode_posterior(self._sequence),
+            [states[row.index(max(row))] for row in posteriors]
+        )
+        self.assertEqual(self._hmm.decode_posterior([]), [])
+
+    def test_hmm_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "model.hmm")
+            self._hmm.save(path)
+            for mmap in [True, False]:
+                loaded = HMM.load(path, mmap=mmap)
+                self.assertAlmostEqual(
+                    loaded.evaluate(self._sequence),
+                    self._hmm.evaluate(self._sequence)
+                )
+                self.assertEqual(
+                    loaded.decode(self._sequence),
+                    self._hmm.decode(self._sequence)
+                )
+                self.assertEqual(list(loaded.get_parameters()["A"][1]), [0.4, 0.6])
+
+            # learning copies the read-only parameters first
+            loaded = HMM.load(path)
+            loaded.learn([self._sequence], iterations=2)
+            self._hmm.learn([self._sequence], iterations=2)
+            self.assertAlmostEqual(
+                loaded.evaluate(self._sequence),
+                self._hmm.evaluate(self._sequence)
+            )
+
+            # loaded models are copied into worker processes
+            for mmap in [True, False]:
+                loaded = HMM.load(path, mmap=mmap)
+                self.assertEqual(
+                    list(deepcopy(loaded).get_parameters()["B"][0]),
+                    list(loaded.get_parameters()["B"][0])
+                )
+                expected = HMM.load(path)
+                expected.learn([self._sequence] * 4, iterations=2)
+                loaded.learn([self._sequence] * 4, iterations=2, n_jobs=2)
+                self.assertAlmostEqual(
+                    loaded.evaluate(self._sequence),
+                    expected.evaluate(self._sequence)
+                )
+
+            with open(path, "wb") as f:
+                f.write(b"not a model" * 10)
+            with self.assertRaises(ValueError):
+                HMM.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_hmm_load_byteswapped(self):
+        # a model saved on a machine of the other byte order
+        header, arrays = encode_model(self._hmm)
+        header["byteorder"] = "big" if sys.byteorder == "little" else "little"
+        chunks = [pack_header(header)]
+        for values in arrays:
+            values.byteswap()
+            chunks.append(_array_bytes(values) + b"\x00" * (-len(values) * 8 % 64))
+        loaded = HMM._from_stored(decode_model(memoryview(b"".join(chunks))))
+        self.assertAlmostEqual(
+            loaded.evaluate(self._sequence),
+            self._hmm.evaluate(self._sequence)
+        )
+        self.assertEqual(list(loaded.get_parameters()["A"][1]), [0.4, 0.6])
+
+    def test_hmm_learn_resume(self):
+        sequences = [
+            ['normal', 'cold', 'dizzy','normal','normal'],
+            ['dizzy', 'dizzy', 'dizzy','cold','normal'],
+            ['cold', 'cold', 'dizzy','normal','normal'],
+        ]
+        params = deepcopy(self._hmm.get_parameters())
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "learn.ckpt")
+            full_iterations = self._hmm.learn(sequences, k_smoothing=0.01)
+
+            # interrupted after 3 re-estimations, checkpointed every 2
+            interrupted = HMM(**params)
+            interrupted.learn(
+                sequences,
+                k_smoothing=0.01,
+                iterations=3,
+                checkpoint=path,
+                checkpoint_every=2
+            )
+            self.assertEqual(os.listdir(directory), ["learn.ckpt"])
+            checkpointed = HMM.load(path)
+            self.assertEqual(len(checkpointed.decode(self._sequence)), len(self._sequence))
+
+            resumed = HMM(**params)
+            state = random.getstate()
+            random.seed(0)
+            iterations = resumed.learn(sequences, k_smoothing=0.01, resume_from=path)
+            self.assertEqual(random.getstate(), state)
+            self.assertEqual(iterations, full_iterations)
+            self.assertEqual(resumed.get_parameters(), self._hmm.get_parameters())
+
+            with self.assertRaises(ValueError):
+                resumed.learn(sequences, resume_from=path, checkpoint_every=0)
+            self._hmm.save(path)
+            with self.assertRaises(ValueError):
+                resumed.learn(sequences, resume_from=path)
+        finally:
+            shutil.rmtree(directory)
+
+    @unittest.skipIf(shared_memory is None, "multiprocessing.shared_memory requires Python 3.8+")
+    def test_hmm_shared_model(self):
+        with SharedModel.create(self._hmm) as shared:
+            attached = pickle.loads(pickle.dumps(shared))
+            hmm = attached.model()
+            self.assertAlmostEqual(
+                hmm.evaluate(self._sequence),
+                self._hmm.evaluate(self._sequence)
+            )
+            self.assertEqual(list(hmm.get_parameters()["B"][0]), [0.5, 0.4, 0.1])
+            hmm = None
+            attached.close()
+
+            pool = Pool(2)
+            try:
+                decoded = pool.map(_decode_shared, [(shared, self._sequence)] * 2)
+            finally:
+                pool.close()
+                pool.join()
+            self.assertEqual(decoded[0], self._hmm.decode(self._sequence))
+
+        # a model left alive keeps the block from closing, not from unlinking
+        shared = SharedModel.create(self._hmm)
+        with self.assertRaises(BufferError):
+            with shared:
+                hmm = shared.model()
+        with self.assertRaises(FileNotFoundError):
+            SharedModel.attach(shared.name)
+        hmm = None
+        shared.close()
+
+def _decode_shared(job):
+    shared, sequence = job
+    decoded = shared.model().decode(sequence)
+    shared.close()
+    return decoded
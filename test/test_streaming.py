@@ -0,0 +1,84 @@
+import unittest
+
+from SimpleHOHMM import HiddenMarkovModelBuilder as Builder
+from SimpleHOHMM import ForwardFilter, StreamingDecoder
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self._obs = [
+            ['normal', 'cold', 'dizzy', 'dizzy','normal','normal'],
+            ['dizzy', 'cold', 'dizzy', 'normal','normal','normal'],
+            ['normal', 'cold', 'dizzy', 'dizzy','cold','normal'],
+            ['dizzy', 'dizzy', 'dizzy', 'dizzy', 'cold', 'cold'],
+            ['cold', 'cold', 'cold', 'normal', 'dizzy', 'normal'],
+            ['dizzy', 'normal', 'cold', 'cold', 'dizzy', 'dizzy']
+        ]
+        self._states = [
+            ['healthy', 'healthy', 'fever', 'fever', 'healthy', 'healthy'],
+            ['fever', 'fever', 'fever', 'healthy', 'healthy', 'fever'],
+            ['healthy', 'healthy', 'fever', 'fever', 'fever', 'healthy'],
+            ['fever', 'fever', 'fever', 'fever', 'fever', 'fever'],
+            ['fever', 'fever', 'fever', 'healthy', 'fever', 'healthy'],
+            ['fever', 'healthy', 'fever', 'fever', 'fever', 'fever']
+        ]
+        self._builder = Builder()
+        self._builder.add_batch_training_examples(self._obs, self._states)
+
+    def tearDown(self):
+        self._builder = None
+
+    def test_matches_decode(self):
+        for order in range(1, 4):
+            hmm = self._builder.build(highest_order=order, k_smoothing=.01)
+            decoder = StreamingDecoder(hmm, lag=None)
+            for seq in self._obs:
+                decoded = []
+                for obs in seq:
+                    decoded += decoder.push(obs)
+                decoded += decoder.flush()
+                self.assertEqual(decoded, hmm.decode(seq))
+
+    def test_bounded_lag(self):
+        hmm = self._builder.build(highest_order=2, k_smoothing=.01)
+        stream = [obs for seq in self._obs for obs in seq] * 20
+        for lag in [0, 1, 4]:
+            decoder = StreamingDecoder(hmm, lag=lag)
+            num_decoded = 0
+            for i, obs in enumerate(stream):
+                num_decoded += len(decoder.push(obs))
+                self.assertGreaterEqual(num_decoded, i + 1 - lag)
+            num_decoded += len(decoder.flush())
+            self.assertEqual(num_decoded, len(stream))
+
+    def test_decode_stream(self):
+        hmm = self._builder.build(highest_order=2, k_smoothing=.01)
+        decoder = StreamingDecoder(hmm, lag=3)
+        decoded = list(decoder.decode_stream(iter(self._obs[0])))
+        self.assertEqual(len(decoded), len(self._obs[0]))
+        self.assertEqual(decoder.flush(), [])
+        with self.assertRaises(ValueError):
+            decoder.push('sneezy')
+        with self.assertRaises(ValueError):
+            StreamingDecoder(hmm, lag=-1)
+
+    def test_forward_filter(self):
+        for order in range(1, 4):
+            hmm = self._builder.build(highest_order=order, k_smoothing=.01)
+            forward_filter = ForwardFilter(hmm)
+            self.assertEqual(forward_filter.state_distribution(), {})
+            seq = self._obs[0] + self._obs[1]
+            for i, obs in enumerate(seq):
+                self.assertAlmostEqual(
+                    forward_filter.push(obs),
+                    hmm.evaluate_log(seq[:i + 1])
+                )
+            distribution = forward_filter.state_distribution()
+            self.assertEqual(set(distribution), set(['healthy', 'fever']))
+            self.assertAlmostEqual(sum(distribution.values()), 1)
+
+            forward_filter.reset()
+            self.assertAlmostEqual(
+                forward_filter.push(seq[0]),
+                hmm.evaluate_log(seq[:1])
+            )